@@ -1,6 +1,8 @@
-import os, subprocess, sys, re, json, shutil
+import os, subprocess, sys, re, json, shutil, threading, queue, tempfile, random, hashlib, sqlite3, itertools, asyncio, math, io, socket, signal, contextvars, contextlib, cProfile, pstats
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from time import sleep
+from time import perf_counter, sleep, time
 
 from colorama import Fore, Style, init
 
@@ -26,12 +28,117 @@ def get_script_directory():
 def resolve_path(file_name):
     return os.path.join(get_script_directory(), file_name)
 
+cache_folder = Path(resolve_path("cache"))
+
+settings_defaults = {
+    "engine": "auto",
+    "metadata_ttl": 86400,
+    "metadata_cache_size": 500,
+    "add_workers": 4,
+    "download_workers": 4,
+    "download_retries": 2,
+    "merge_group_size": 100,
+    "prefetch_bytes": 2097152,
+    "direct_stream": True,
+    "stream_url_ttl": 3600,
+    "cache_on_play": False,
+    "audio_cache_mb": 1024,
+    "library_flush_delay": 1.0,
+    "library_backend": "txt",
+    "page_size": 20,
+    "transcode_pipeline": True,
+    "transcode": True,
+    "audio_codec": "mp3",
+    "audio_bitrate": "192k",
+    "audio_output": "auto",
+    "normalize": True,
+    "target_loudness": -14.0,
+    "trace_window": 1000,
+}
+settings = dict(settings_defaults)
+
+trace_stats = {}
+trace_lock = threading.Lock()
+trace_events = None
+
+def record_span(kind, key, started, detail=None):
+    elapsed = perf_counter() - started
+    with trace_lock:
+        samples = trace_stats.get((kind, key))
+        if samples is None:
+            samples = trace_stats[(kind, key)] = deque(maxlen=max(1, int(settings["trace_window"])))
+        samples.append((elapsed, detail))
+        if trace_events is not None:
+            trace_events.append({
+                "name": key, "cat": kind, "ph": "X", "ts": round(started * 1e6), "dur": round(elapsed * 1e6),
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": {"detail": detail} if detail else {},
+            })
+
+@contextlib.contextmanager
+def trace_span(kind, key, detail=None):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        record_span(kind, key, started, detail)
+
+def command_line(command):
+    return command if isinstance(command, str) else " ".join(map(str, command))
+
+def process_key(command):
+    return Path(command_line(command).split()[0]).name
+
+def run_process(command, **kwargs):
+    with trace_span("subprocess", process_key(command), command_line(command)):
+        return subprocess.run(command, **kwargs)
+
+class TracedPopen(subprocess.Popen):
+    def __init__(self, command, **kwargs):
+        self.trace_started = perf_counter()
+        self.trace_recorded = False
+        super().__init__(command, **kwargs)
+
+    def trace(self):
+        if not self.trace_recorded and self.returncode is not None:
+            self.trace_recorded = True
+            record_span("subprocess", process_key(self.args), self.trace_started, command_line(self.args))
+
+    def wait(self, timeout=None):
+        try:
+            return super().wait(timeout)
+        finally:
+            self.trace()
+
+    def poll(self):
+        returncode = super().poll()
+        self.trace()
+        return returncode
+
+@contextlib.contextmanager
+def open_traced(path, mode="r", **kwargs):
+    name = re.sub(r"[0-9a-f]{16,}", "*", Path(path).name)
+    with trace_span("file", f"{'write' if set(mode) & set('wax') else 'read'} {name}", str(path)):
+        with open(path, mode, **kwargs) as file:
+            yield file
+
+def read_settings(file_path):
+    if not os.path.exists(file_path):
+        write_file(file_path, json.dumps(settings_defaults, indent=4))
+        sys.stdout.write(f"{SUCCESS}[file created]: {file_path} with default settings{RESET}\n")
+    try:
+        with open_traced(file_path, "r") as file:
+            loaded = json.load(file)
+        settings.update({key: value for key, value in loaded.items() if key in settings_defaults})
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not read settings: {e}{RESET}\n")
+    return settings
+
 def read_file(file_path, default_value=100):
     if not os.path.exists(file_path):
         write_file(file_path, default_value)  
         sys.stdout.write(f"{SUCCESS}[file created]: {file_path} with default value: {default_value}{RESET}\n")
     try:
-        with open(file_path, "r") as file:
+        with open_traced(file_path, "r") as file:
             return file.read().strip()
     except Exception as e:
         sys.stdout.write(f"{ERROR}[error]: could not read file: {e}{RESET}\n")
@@ -39,7 +146,7 @@ def read_file(file_path, default_value=100):
 
 def write_file(file_path, content):
     try:
-        with open(file_path, "w") as file:
+        with open_traced(file_path, "w") as file:
             file.write(str(content))
     except Exception as e:
         sys.stdout.write(f"{ERROR}[error]: could not write to file: {e}{RESET}\n")
@@ -62,11 +169,13 @@ https://www.youtube.com/watch?v=1PkJmurhQfU EBSM Radio - dark industrial music f
         return [(url, title) for url, title in [line.split(maxsplit=1) for line in default_value.strip().split("\n")]]
     
     try:
-        with open(file_path, "r") as file:
+        with open_traced(file_path, "r") as file:
             lines = file.readlines()
             urls = []
             for line in lines:
                 parts = line.strip().split(maxsplit=1)
+                if not parts:
+                    continue
                 if len(parts) == 2:
                     urls.append((parts[0], parts[1]))
                 else:
@@ -77,20 +186,800 @@ https://www.youtube.com/watch?v=1PkJmurhQfU EBSM Radio - dark industrial music f
         return [(url, "unknown title") for url in default_value.split("\n")]
 
 def display_urls_with_titles(urls):
-    os.system('cls')
+    if sys.stdout.isatty():
+        with trace_span("subprocess", "cls"):
+            os.system('cls')
     sys.stdout.write(f"{HEADER}~ tracks loaded ~{RESET}\n")
-    for i, (url) in enumerate(zip(urls), start=1):
-        sys.stdout.write(f"{INFO}{i}: {url[0][1]} ({url[0][0]}){RESET}\n")
+    sys.stdout.write("".join(f"{INFO}{i}: {title} ({url}){RESET}\n" for i, (url, title) in enumerate(urls, start=1)))
 
-def get_track_url(playlist_url, track_number):
+def normalize_url(url):
+    playlist = re.search(r"[?&]list=([\w-]+)", url)
+    if playlist:
+        return f"playlist:{playlist.group(1)}"
+    video = re.search(r"(?:[?&]v=|youtu\.be/|/shorts/|/live/|/embed/)([\w-]{11})", url)
+    if video:
+        return f"video:{video.group(1)}"
+    return url.strip().rstrip("/")
+
+class Library:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.entries = read_urls(file_path)
+        self.index = {normalize_url(url): i for i, (url, _) in enumerate(self.entries)}
+        self.lock = threading.Lock()
+        self.flush_timer = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, position):
+        return self.entries[position]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, url):
+        return normalize_url(url) in self.index
+
+    def add(self, entries):
+        added = []
+        with self.lock:
+            for url, title in entries:
+                key = normalize_url(url)
+                if key in self.index:
+                    continue
+                self.index[key] = len(self.entries)
+                self.entries.append((url, title))
+                added.append((url, title))
+        self.save_later()
+        return added
+
+    def remove(self, entry_numbers):
+        with self.lock:
+            dropped = {number - 1 for number in entry_numbers}
+            self.entries = [entry for i, entry in enumerate(self.entries) if i not in dropped]
+            self.index = {normalize_url(url): i for i, (url, _) in enumerate(self.entries)}
+        self.save_later()
+
+    def save_later(self):
+        with self.lock:
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(float(settings["library_flush_delay"]), self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.flush_timer is None:
+                return
+            self.flush_timer.cancel()
+            self.flush_timer = None
+            lines = "".join(f"{url} {title}\n" for url, title in self.entries)
+        try:
+            temp_file = f"{self.file_path}.tmp"
+            with open_traced(temp_file, "w") as file:
+                file.write(lines)
+            os.replace(temp_file, self.file_path)
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not write to file: {e}{RESET}\n")
+
+    def search(self, query, page, page_size):
+        tokens = query.lower().split()
+        matches = [
+            (title, f"{i}")
+            for i, (_, title) in enumerate(self.entries, start=1)
+            if all(token in title.lower() for token in tokens)
+        ]
+        for i, (url, title) in enumerate(self.entries, start=1):
+            entries = load_playlist_index(url)["entries"] if title.startswith("[playlist]") else []
+            for position, entry in enumerate(entries, start=1):
+                if all(token in entry.get("title", "").lower() for token in tokens):
+                    matches.append((entry["title"], f"{i}.{position}"))
+        return matches[(page - 1) * page_size:page * page_size], len(matches)
+
+class SqliteLibrary(Library):
+    def __init__(self, file_path, db_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.flush_timer = None
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tracks (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, url TEXT, title TEXT);
+            CREATE TABLE IF NOT EXISTS entries (playlist_key TEXT, position INTEGER, url TEXT, title TEXT, PRIMARY KEY (playlist_key, position));
+        """)
+        self.fts = False
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self.connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(title, kind UNINDEXED, key UNINDEXED, position UNINDEXED, tokenize='{tokenizer}')")
+                self.fts = True
+                break
+            except sqlite3.OperationalError:
+                continue
+        if self.fts:
+            schema = self.connection.execute("SELECT sql FROM sqlite_master WHERE name = 'search'").fetchone()[0]
+            self.substring = "trigram" in schema
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE playlist_key NOT IN (SELECT key FROM tracks)")
+            if self.fts:
+                self.connection.execute("DELETE FROM search WHERE kind = 'entry' AND key NOT IN (SELECT key FROM tracks)")
+
+        rows = self.connection.execute("SELECT id, url, title FROM tracks ORDER BY id").fetchall()
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] == 0:
+            if not rows and os.path.exists(file_path):
+                self.migrate()
+                rows = self.connection.execute("SELECT id, url, title FROM tracks ORDER BY id").fetchall()
+            self.connection.execute("PRAGMA user_version = 1")
+        self.ids = [row[0] for row in rows]
+        self.entries = [(row[1], row[2]) for row in rows]
+        self.index = {normalize_url(url): i for i, (url, _) in enumerate(self.entries)}
+
+    def migrate(self):
+        entries = read_urls(self.file_path)
+        with self.connection:
+            self.insert_tracks(entries)
+        for url, title in entries:
+            cached = metadata_cache.get(url)
+            if cached and "entries" in cached["data"]:
+                self.index_playlist(url, cached["data"]["entries"])
+        sys.stdout.write(f"{SUCCESS}[migrated]: {len(entries)} tracks from {self.file_path} into the library database{RESET}\n")
+
+    def insert_tracks(self, entries):
+        inserted = []
+        for url, title in entries:
+            key = normalize_url(url)
+            cursor = self.connection.execute("INSERT OR IGNORE INTO tracks (key, url, title) VALUES (?, ?, ?)", (key, url, title))
+            if cursor.rowcount:
+                inserted.append((cursor.lastrowid, url, title))
+                if self.fts:
+                    self.connection.execute("INSERT INTO search (title, kind, key, position) VALUES (?, 'track', ?, 0)", (title, key))
+        return inserted
+
+    def add(self, entries):
+        added = []
+        with self.lock, self.connection:
+            for row_id, url, title in self.insert_tracks(list(entries)):
+                self.index[normalize_url(url)] = len(self.entries)
+                self.ids.append(row_id)
+                self.entries.append((url, title))
+                added.append((url, title))
+        for url, title in added:
+            if title.startswith("[playlist]"):
+                self.index_playlist(url, load_playlist_index(url)["entries"])
+        return added
+
+    def remove(self, entry_numbers):
+        with self.lock, self.connection:
+            dropped = {i - 1 for i in entry_numbers}
+            keys = [(normalize_url(self.entries[i][0]),) for i in dropped]
+            self.connection.executemany("DELETE FROM tracks WHERE id = ?", [(self.ids[i],) for i in dropped])
+            self.connection.executemany("DELETE FROM entries WHERE playlist_key = ?", keys)
+            if self.fts:
+                self.connection.executemany("DELETE FROM search WHERE key = ?", keys)
+            self.ids = [row_id for i, row_id in enumerate(self.ids) if i not in dropped]
+            self.entries = [entry for i, entry in enumerate(self.entries) if i not in dropped]
+            self.index = {normalize_url(url): i for i, (url, _) in enumerate(self.entries)}
+
+    def index_playlist(self, url, entries):
+        key = normalize_url(url)
+        rows = [(key, position, entry.get("url"), entry.get("title", "")) for position, entry in enumerate(entries, start=1)]
+        with self.lock, self.connection:
+            if not self.connection.execute("SELECT 1 FROM tracks WHERE key = ?", (key,)).fetchone():
+                return
+            self.connection.execute("DELETE FROM entries WHERE playlist_key = ?", (key,))
+            self.connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+            if self.fts:
+                self.connection.execute("DELETE FROM search WHERE key = ? AND kind = 'entry'", (key,))
+                self.connection.executemany(
+                    "INSERT INTO search (title, kind, key, position) VALUES (?, 'entry', ?, ?)",
+                    [(title, key, position) for key, position, _, title in rows]
+                )
+
+    def flush(self):
+        pass
+
+    def search(self, query, page, page_size):
+        with self.lock:
+            tokens = [token for token in query.split() if len(token) >= 3 or not self.fts or not self.substring]
+            if self.fts and tokens:
+                suffix = "" if self.substring else "*"
+                match = " ".join('"' + token.replace('"', '""') + '"' + suffix for token in tokens)
+                total = self.connection.execute("SELECT count(*) FROM search WHERE search MATCH ?", (match,)).fetchone()[0]
+                rows = self.connection.execute(
+                    "SELECT title, kind, key, position FROM search WHERE search MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                    (match, page_size, (page - 1) * page_size)
+                ).fetchall()
+            else:
+                pattern = "%" + "%".join(query.split()) + "%"
+                union = """
+                    SELECT title, 'track', key, 0 FROM tracks WHERE title LIKE ?1
+                    UNION ALL SELECT title, 'entry', playlist_key, position FROM entries WHERE title LIKE ?1
+                """
+                total = self.connection.execute(f"SELECT count(*) FROM ({union})", (pattern,)).fetchone()[0]
+                rows = self.connection.execute(f"{union} LIMIT ?2 OFFSET ?3", (pattern, page_size, (page - 1) * page_size)).fetchall()
+
+        matches = []
+        for title, kind, key, position in rows:
+            if key in self.index:
+                number = self.index[key] + 1
+                matches.append((title, f"{number}.{position}" if kind == "entry" else f"{number}"))
+        return matches, total
+
+def find_tracks(library, query, page):
+    page_size = max(1, int(settings["page_size"]))
+    started = time()
+    matches, total = library.search(query, page, page_size)
+    elapsed = (time() - started) * 1000
+    pages = max(1, -(-total // page_size))
+    sys.stdout.write(f"{HEADER}~ {total} match(es) for '{query}', page {page}/{pages} ({elapsed:.1f} ms) ~{RESET}\n")
+    for title, number in matches:
+        sys.stdout.write(f"{INFO}{number}: {title}{RESET}\n")
+    if page < pages:
+        sys.stdout.write(f"{INFO}[more]: find {query} --page {page + 1}{RESET}\n")
+
+metadata_cache = OrderedDict()
+metadata_stats = {"hits": 0, "misses": 0}
+metadata_lock = threading.RLock()
+metadata_cache_file = cache_folder / "metadata.json"
+
+def load_metadata_cache():
+    metadata_cache.clear()
+    if not metadata_cache_file.exists():
+        return
+    try:
+        with open_traced(metadata_cache_file, "r", encoding="utf-8") as file:
+            for url, entry in json.load(file).items():
+                metadata_cache[url] = entry
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not read metadata cache: {e}{RESET}\n")
+
+def save_metadata_cache():
+    with metadata_lock:
+        try:
+            cache_folder.mkdir(parents=True, exist_ok=True)
+            temp_file = metadata_cache_file.with_suffix(".tmp")
+            with open_traced(temp_file, "w", encoding="utf-8") as file:
+                json.dump(metadata_cache, file)
+            os.replace(temp_file, metadata_cache_file)
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not write metadata cache: {e}{RESET}\n")
+
+def slim_metadata(metadata):
+    slim = {key: metadata[key] for key in ("id", "title", "_type", "url", "webpage_url") if key in metadata}
+    if "entries" in metadata:
+        slim["entries"] = [
+            {key: entry[key] for key in ("id", "url", "title") if key in entry}
+            for entry in metadata.get("entries") or [] if entry
+        ]
+    return slim
+
+def cache_get(url):
+    with metadata_lock:
+        entry = metadata_cache.get(url)
+        if entry is None:
+            metadata_stats["misses"] += 1
+            return None
+        if time() - entry["time"] > settings["metadata_ttl"]:
+            del metadata_cache[url]
+            metadata_stats["misses"] += 1
+            return None
+        metadata_cache.move_to_end(url)
+        metadata_stats["hits"] += 1
+        return entry["data"]
+
+def cache_put(url, metadata, save=True):
+    with metadata_lock:
+        metadata_cache[url] = {"time": time(), "data": slim_metadata(metadata)}
+        metadata_cache.move_to_end(url)
+        while len(metadata_cache) > max(1, int(settings["metadata_cache_size"])):
+            metadata_cache.popitem(last=False)
+        if save:
+            save_metadata_cache()
+        return metadata_cache[url]["data"]
+
+def clear_metadata_cache():
+    with metadata_lock:
+        metadata_cache.clear()
+        metadata_stats["hits"] = metadata_stats["misses"] = 0
+        if metadata_cache_file.exists():
+            metadata_cache_file.unlink()
+
+def print_cache_stats():
+    lookups = metadata_stats["hits"] + metadata_stats["misses"]
+    hit_rate = f"{metadata_stats['hits'] / lookups * 100:.0f}%" if lookups else "n/a"
+    disk_size = metadata_cache_file.stat().st_size if metadata_cache_file.exists() else 0
+    playlists = sum(1 for entry in metadata_cache.values() if "entries" in entry["data"])
+    sys.stdout.write(f"\n{HEADER}[metadata cache]{RESET}\n")
+    sys.stdout.write(f"{INFO}entries   : {len(metadata_cache)}/{settings['metadata_cache_size']} ({playlists} playlists){RESET}\n")
+    sys.stdout.write(f"{INFO}hits      : {metadata_stats['hits']} / {lookups} lookups ({hit_rate}){RESET}\n")
+    sys.stdout.write(f"{INFO}ttl       : {settings['metadata_ttl']}s{RESET}\n")
+    sys.stdout.write(f"{INFO}disk size : {disk_size / 1024:.1f} KB ({metadata_cache_file}){RESET}\n")
+    live_streams = sum(1 for entry in stream_cache.values() if entry["expires"] > time())
+    sys.stdout.write(f"{INFO}streams   : {live_streams} resolved stream URL(s) still valid{RESET}\n")
+
+yt_dlp_api = None
+engine_local = threading.local()
+def engine_progress_hook(status):
+    progress = getattr(engine_local, "progress", None)
+    if progress and status["status"] in ("downloading", "finished"):
+        progress(status.get("downloaded_bytes") or 0, status.get("total_bytes") or status.get("total_bytes_estimate") or 0)
+
+def engine_post_hook(file_path):
+    engine_local.__dict__.setdefault("files", []).append(file_path)
+
+engine_profiles = {
+    "flat": {"extract_flat": "in_playlist", "skip_download": True},
+    "download": {
+        "format": "bestaudio/best",
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3"}],
+        "noprogress": True,
+        "progress_hooks": [engine_progress_hook],
+        "post_hooks": [engine_post_hook],
+    },
+    "stream": {"format": "bestaudio/best", "skip_download": True},
+    "raw": {
+        "format": "bestaudio/best",
+        "noprogress": True,
+        "progress_hooks": [engine_progress_hook],
+        "post_hooks": [engine_post_hook],
+    },
+}
+
+class QuietLogger:
+    def debug(self, message): pass
+    def info(self, message): pass
+    def warning(self, message): pass
+    def error(self, message): pass
+
+def load_yt_dlp_api():
+    global yt_dlp_api
+    if yt_dlp_api is None:
+        try:
+            import yt_dlp
+            yt_dlp_api = yt_dlp
+        except ImportError:
+            yt_dlp_api = False
+            if settings["engine"] == "api":
+                sys.stdout.write(f"{ERROR}[missing]: yt_dlp module not installed, using the yt-dlp executable{RESET}\n")
+    return yt_dlp_api
+
+def api_engine_enabled():
+    return settings["engine"] != "subprocess" and bool(load_yt_dlp_api())
+
+def get_youtube_dl(profile):
+    instances = engine_local.__dict__.setdefault("instances", {})
+    if profile not in instances:
+        params = {"quiet": True, "no_warnings": True, "logger": QuietLogger(), **engine_profiles[profile]}
+        instances[profile] = yt_dlp_api.YoutubeDL(params)
+    return instances[profile]
+
+worker_pools = {}
+worker_pools_lock = threading.Lock()
+
+def worker_pool(name, size):
+    size = max(1, int(size))
+    with worker_pools_lock:
+        pool_size, pool = worker_pools.get(name, (None, None))
+        if pool_size != size:
+            if pool:
+                pool.shutdown(wait=False)
+            pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=name)
+            worker_pools[name] = (size, pool)
+        return pool
+
+def probe_urls(urls):
+    if api_engine_enabled():
+        probed = []
+        ydl = get_youtube_dl("flat")
+        for url in urls:
+            try:
+                with trace_span("yt-dlp", "probe", url):
+                    probed.append(ydl.sanitize_info(ydl.extract_info(url, download=False)))
+            except yt_dlp_api.utils.DownloadError:
+                continue
+    else:
+        command = ["yt-dlp", "--flat-playlist", "--dump-single-json", "--ignore-errors", "--no-warnings", *urls]
+        result = run_process(command, capture_output=True, text=True)
+        probed = [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+    resolved = {}
+    for metadata in probed:
+        if not isinstance(metadata, dict):
+            continue
+        source = metadata.get("original_url") or metadata.get("webpage_url")
+        if source in urls:
+            resolved[source] = metadata
+    return resolved
+
+def engine_download(url, output_template, progress=None, extract=True):
+    if api_engine_enabled():
+        ydl = get_youtube_dl("download" if extract else "raw")
+        ydl.params["outtmpl"]["default"] = output_template
+        engine_local.progress = progress
+        engine_local.files = []
+        try:
+            with trace_span("yt-dlp", "download", url):
+                ydl.download([url])
+        except yt_dlp_api.utils.DownloadError:
+            raise subprocess.CalledProcessError(1, ["yt-dlp", url])
+        finally:
+            engine_local.progress = None
+        return engine_local.files
+
+    command = [
+        "yt-dlp", *(["--extract-audio", "--audio-format", "mp3"] if extract else ["-f", "bestaudio/best"]),
+        "--newline", "--progress",
+        "--progress-template", "download:[progress] %(progress.downloaded_bytes)s %(progress.total_bytes,progress.total_bytes_estimate)s",
+        "--print", "after_move:filepath",
+        "--output", output_template, url
+    ]
+    files = []
+    with TracedPopen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+        for line in process.stdout:
+            line = line.strip()
+            if line.startswith("[progress]"):
+                _, downloaded, total = line.split()
+                if progress and downloaded.isdigit():
+                    progress(int(downloaded), int(float(total)) if total.replace(".", "", 1).isdigit() else 0)
+            elif line:
+                files.append(line)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return files
+
+stream_cache = {}
+stream_cache_file = cache_folder / "streams.json"
+stream_lock = threading.Lock()
+
+def load_stream_cache():
+    stream_cache.clear()
+    if stream_cache_file.exists():
+        try:
+            with open_traced(stream_cache_file, "r", encoding="utf-8") as file:
+                stream_cache.update(json.load(file))
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not read stream cache: {e}{RESET}\n")
+
+def save_stream_cache():
+    try:
+        cache_folder.mkdir(parents=True, exist_ok=True)
+        temp_file = stream_cache_file.with_suffix(".tmp")
+        with open_traced(temp_file, "w", encoding="utf-8") as file:
+            json.dump(stream_cache, file)
+        os.replace(temp_file, stream_cache_file)
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not write stream cache: {e}{RESET}\n")
+
+def engine_stream_url(url, stream_format):
+    if api_engine_enabled():
+        ydl = get_youtube_dl("stream")
+        ydl.params["format"] = stream_format
+        try:
+            with trace_span("yt-dlp", "stream url", url):
+                info = ydl.extract_info(url, download=False)
+        except yt_dlp_api.utils.DownloadError:
+            return None
+        return info.get("url") or (info.get("requested_formats") or [{}])[0].get("url")
+
+    command = ["yt-dlp", "-f", stream_format, "--get-url", "--no-warnings", url]
+    result = run_process(command, capture_output=True, text=True)
+    lines = result.stdout.split()
+    return lines[0] if result.returncode == 0 and lines else None
+
+def resolve_stream_url(url, stream_format="bestaudio"):
+    key = f"{stream_format} {url}"
+    with stream_lock:
+        cached = stream_cache.get(key)
+        if cached and cached["expires"] - 60 > time():
+            return cached["url"], True
+
+    direct_url = engine_stream_url(url, stream_format)
+    if direct_url is None:
+        return None, False
+    expiry = re.search(r"expire[=/](\d+)", direct_url)
+    expires = int(expiry.group(1)) if expiry else time() + int(settings["stream_url_ttl"])
+    with stream_lock:
+        for expired_key in [cached_key for cached_key, entry in stream_cache.items() if entry["expires"] <= time()]:
+            del stream_cache[expired_key]
+        stream_cache[key] = {"url": direct_url, "expires": expires}
+        save_stream_cache()
+    return direct_url, False
+
+def forget_stream_url(url, stream_format="bestaudio"):
+    with stream_lock:
+        if stream_cache.pop(f"{stream_format} {url}", None):
+            save_stream_cache()
+
+store_index = {}
+store_file = cache_folder / "store.json"
+audio_cache_folder = cache_folder / "audio"
+store_lock = threading.Lock()
+
+def load_store():
+    store_index.clear()
+    if store_file.exists():
+        try:
+            with open_traced(store_file, "r", encoding="utf-8") as file:
+                store_index.update(json.load(file))
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not read local store: {e}{RESET}\n")
+
+def save_store():
+    try:
+        cache_folder.mkdir(parents=True, exist_ok=True)
+        temp_file = store_file.with_suffix(".tmp")
+        with open_traced(temp_file, "w", encoding="utf-8") as file:
+            json.dump(store_index, file)
+        os.replace(temp_file, store_file)
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not write local store: {e}{RESET}\n")
+
+def store_put(keys, path, cached=False):
+    with store_lock:
+        entry = {"path": str(path), "size": os.path.getsize(path), "used": time(), "cached": cached}
+        for key in keys:
+            store_index[key] = entry
+        if cached:
+            evict_audio_cache()
+        save_store()
+
+def store_lookup(url):
+    with store_lock:
+        entry = store_index.get(url)
+        if entry is None:
+            return None
+        if not os.path.exists(entry["path"]):
+            del store_index[url]
+            save_store()
+            return None
+        entry["used"] = time()
+        return entry["path"]
+
+def evict_audio_cache():
+    cached = {entry["path"]: entry for entry in store_index.values() if entry.get("cached")}
+    limit = int(settings["audio_cache_mb"]) * 1024 * 1024
+    total = sum(entry["size"] for entry in cached.values())
+    for path, entry in sorted(cached.items(), key=lambda item: item[1]["used"]):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= entry["size"]
+        for key in [key for key, value in store_index.items() if value["path"] == path]:
+            del store_index[key]
+
+def audio_cache_path(url):
+    return audio_cache_folder / f"{hashlib.sha1(url.encode()).hexdigest()}.audio"
+
+loudness_index = {}
+loudness_file = cache_folder / "loudness.json"
+loudness_lock = threading.Lock()
+
+def load_loudness():
+    loudness_index.clear()
+    if loudness_file.exists():
+        try:
+            with open_traced(loudness_file, "r", encoding="utf-8") as file:
+                loudness_index.update(json.load(file))
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not read loudness index: {e}{RESET}\n")
+
+def save_loudness():
     try:
-        command = ["yt-dlp", "--flat-playlist", "--dump-single-json", playlist_url]
-        result = subprocess.run(command, capture_output=True, text=True)
+        cache_folder.mkdir(parents=True, exist_ok=True)
+        temp_file = loudness_file.with_suffix(".tmp")
+        with open_traced(temp_file, "w", encoding="utf-8") as file:
+            json.dump(loudness_index, file)
+        os.replace(temp_file, loudness_file)
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not write loudness index: {e}{RESET}\n")
+
+def loudness_lookup(key):
+    with loudness_lock:
+        entry = loudness_index.get(key)
+    if entry and "mtime" in entry:
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        if entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+            return None
+    return entry
+
+def loudness_put(key, lufs, peak, method, save=True):
+    entry = {"lufs": lufs, "peak": peak, "method": method}
+    if os.path.isfile(key):
+        stat = os.stat(key)
+        entry.update(mtime=stat.st_mtime, size=stat.st_size)
+    with loudness_lock:
+        loudness_index[key] = entry
+        if save:
+            save_loudness()
+
+def normalization_gain(key):
+    entry = loudness_lookup(key) if settings["normalize"] else None
+    if not entry or entry["lufs"] is None:
+        return 1.0
+    gain = 10 ** ((float(settings["target_loudness"]) - entry["lufs"]) / 20)
+    return min(gain, 1 / entry["peak"]) if entry["peak"] > 0 else gain
+
+audio_extensions = {".mp3", ".m4a", ".opus", ".ogg", ".flac", ".webm", ".wav"}
+
+def measure_loudness(path):
+    command = ["ffmpeg", "-hide_banner", "-nostats", "-i", str(path), "-vn", "-af", "ebur128=peak=true:framelog=verbose", "-f", "null", "-"]
+    result = run_process(command, capture_output=True, text=True, errors="replace")
+    summary = result.stderr[result.stderr.rfind("Summary:"):]
+    lufs = re.search(r"I:\s+(-?[\d.]+|-inf) LUFS", summary)
+    peak = re.search(r"Peak:\s+(-?[\d.]+|-inf) dBFS", summary)
+    if result.returncode != 0 or not lufs or not peak:
+        return None
+    lufs = None if lufs.group(1) == "-inf" else float(lufs.group(1))
+    peak = 0.0 if peak.group(1) == "-inf" else round(10 ** (float(peak.group(1)) / 20), 4)
+    return lufs, peak
+
+def analyze_files(paths, progress=False):
+    paths = [str(path) for path in paths]
+    results = {path: loudness_lookup(path) for path in paths}
+    pending = [path for path, entry in results.items() if entry is None or entry.get("method") != "ebur128"]
+    failed = 0
+    if pending:
+        workers = min(os.cpu_count() or 1, len(pending))
+        if progress:
+            sys.stdout.write(f"{INFO}[analyzing]: {len(pending)} new or changed of {len(paths)} file(s) with {workers} worker(s){RESET}\n")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for done, (path, measured) in enumerate(zip(pending, pool.map(measure_loudness, pending)), start=1):
+                if measured:
+                    loudness_put(path, *measured, "ebur128", save=False)
+                    results[path] = loudness_lookup(path)
+                else:
+                    failed += 1
+                if progress:
+                    sys.stdout.write(f"\r{INFO}[progress]: {done}/{len(pending)} files{RESET}   ")
+                    sys.stdout.flush()
+        if progress:
+            sys.stdout.write("\n")
+    with loudness_lock:
+        for key in [key for key, entry in loudness_index.items() if "mtime" in entry and not os.path.exists(key)]:
+            del loudness_index[key]
+        save_loudness()
+    return results, len(pending) - failed, failed
 
-        if result.returncode == 0:
-            playlist_data = json.loads(result.stdout)
-            entries = playlist_data.get("entries", [])
+def analyze_library(folder=None):
+    folder = Path(folder) if folder else downloads_folder
+    if not folder.is_dir():
+        sys.stdout.write(f"{ERROR}[error]: {folder} is not a folder{RESET}\n")
+        return
+    paths = sorted(path for path in folder.rglob("*") if path.suffix.lower() in audio_extensions and ".staging" not in path.parts)
+    try:
+        results, measured, failed = analyze_files(paths, progress=True)
+    except FileNotFoundError:
+        sys.stdout.write(f"{ERROR}[missing]: ffmpeg is not installed or in your PATH{RESET}\n")
+        return
+    loudness = [entry["lufs"] for entry in results.values() if entry and entry["lufs"] is not None]
+    sys.stdout.write(f"{SUCCESS}[completed]: {measured} analyzed, {len(paths) - measured - failed} unchanged, {failed} failed{RESET}\n")
+    if loudness:
+        sys.stdout.write(f"{INFO}[loudness]: {min(loudness):.1f} to {max(loudness):.1f} LUFS across {len(loudness)} file(s){RESET}\n")
+
+playlist_listeners = []
+
+def resolve_metadata(urls):
+    metadata = {}
+    missing = []
+    for url in dict.fromkeys(urls):
+        cached = cache_get(url)
+        if cached is not None:
+            metadata[url] = cached
+        else:
+            missing.append(url)
+
+    if missing:
+        for url, probed in probe_urls(missing).items():
+            metadata[url] = cache_put(url, probed, save=False)
+            if "entries" in metadata[url]:
+                seed_playlist_index(url, metadata[url]["entries"])
+                for listener in playlist_listeners:
+                    listener(url, metadata[url]["entries"])
+        save_metadata_cache()
+    return {url: metadata.get(url) for url in urls}
+
+playlist_folder = cache_folder / "playlists"
+
+def playlist_index_path(url):
+    return playlist_folder / f"{hashlib.sha1(normalize_url(url).encode()).hexdigest()}.json"
+
+def load_playlist_index(url):
+    path = playlist_index_path(url)
+    if path.exists():
+        try:
+            with open_traced(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not read playlist index: {e}{RESET}\n")
+    return {"url": url, "entries": [], "complete": False, "updated": 0}
+
+def save_playlist_index(index):
+    try:
+        playlist_folder.mkdir(parents=True, exist_ok=True)
+        path = playlist_index_path(index["url"])
+        temp_file = path.with_suffix(".tmp")
+        with open_traced(temp_file, "w", encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(temp_file, path)
+    except Exception as e:
+        sys.stdout.write(f"{ERROR}[error]: could not write playlist index: {e}{RESET}\n")
 
+def stream_playlist_entries(url, start):
+    if api_engine_enabled():
+        ydl = get_youtube_dl("flat")
+        try:
+            with trace_span("yt-dlp", "playlist", url):
+                playlist = ydl.extract_info(url, download=False, process=False)
+                while playlist.get("_type") in ("url", "url_transparent"):
+                    playlist = ydl.extract_info(playlist["url"], download=False, process=False)
+                for entry in itertools.islice(playlist.get("entries") or [], start - 1, None):
+                    if entry:
+                        yield {key: entry[key] for key in ("id", "url", "title") if key in entry}
+        except yt_dlp_api.utils.DownloadError:
+            raise subprocess.CalledProcessError(1, ["yt-dlp", url])
+        return
+
+    command = ["yt-dlp", "--flat-playlist", "--dump-json", "--no-warnings", "--playlist-items", f"{start}:", url]
+    with TracedPopen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+        try:
+            for line in process.stdout:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield {key: entry[key] for key in ("id", "url", "title") if key in entry}
+        finally:
+            if process.poll() is None:
+                process.kill()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def playlist_entries(url, count=None, on_entry=None, refresh=False):
+    index = load_playlist_index(url)
+    stale = time() - index["updated"] > settings["metadata_ttl"]
+    if index["complete"] and (refresh or (stale and count is None)):
+        index["complete"] = False
+
+    if index["complete"] or (count is not None and len(index["entries"]) >= count):
+        return index["entries"]
+
+    known = {entry.get("id") for entry in index["entries"]}
+    finished = True
+    try:
+        for entry in stream_playlist_entries(url, len(index["entries"]) + 1):
+            if entry.get("id") in known:
+                continue
+            index["entries"].append(entry)
+            known.add(entry.get("id"))
+            if on_entry:
+                on_entry(len(index["entries"]), entry)
+            if count is not None and len(index["entries"]) >= count:
+                finished = False
+                break
+    except subprocess.CalledProcessError:
+        finished = False
+        sys.stdout.write(f"{ERROR}[error]: yt-dlp stopped listing {url} after {len(index['entries'])} entries{RESET}\n")
+    index["complete"] = finished
+    index["updated"] = time()
+    save_playlist_index(index)
+    for listener in playlist_listeners:
+        listener(url, index["entries"])
+    return index["entries"]
+
+def seed_playlist_index(url, entries):
+    save_playlist_index({"url": url, "entries": entries, "complete": True, "updated": time()})
+
+def fetch_metadata(url):
+    return resolve_metadata([url])[url]
+
+def get_track_url(playlist_url, track_number):
+    try:
+        entries = playlist_entries(playlist_url, count=track_number)
+
+        if entries:
             if 1 <= track_number <= len(entries):
                 return entries[track_number - 1]["url"]
             else:
@@ -109,375 +998,1504 @@ def get_track_url(playlist_url, track_number):
         sys.stdout.write(f"{ERROR}[error]: unexpected error occurred: {e}{RESET}\n")
         return None
 
-def play_youtube_audio(url, volume):
-    command = [
-        "yt-dlp",
-        "-f", "bestaudio",
-        "-o", "-",  
-        url
-    ]
-    ffplay_command = [
-        "ffplay", "-i", "-", 
-        "-nodisp", "-autoexit", 
-        "-af", f"volume={int(volume)/100}", 
-        "-loglevel", "quiet"  
-    ]
+def open_stream(url):
+    command = ["yt-dlp", "-f", "bestaudio", "-o", "-", url]
+    stream = {
+        "url": url,
+        "process": TracedPopen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL),
+        "buffer": bytearray(),
+    }
+
+    def fill():
+        while len(stream["buffer"]) < int(settings["prefetch_bytes"]):
+            chunk = stream["process"].stdout.read1(65536)
+            if not chunk:
+                break
+            stream["buffer"] += chunk
+
+    stream["thread"] = threading.Thread(target=fill, daemon=True)
+    stream["thread"].start()
+    return stream
+
+def close_stream(stream):
+    if stream and stream["process"].poll() is None:
+        stream["process"].kill()
+        stream["process"].wait()
+
+numpy_api = None
+sounddevice_api = None
+pcm_rate = 48000
+pcm_block_frames = 4096
+
+def load_numpy():
+    global numpy_api
+    if numpy_api is None:
+        try:
+            import numpy
+            numpy_api = numpy
+        except ImportError:
+            numpy_api = False
+            if settings["audio_output"] == "pcm":
+                sys.stdout.write(f"{ERROR}[missing]: numpy module not installed, playing through ffplay{RESET}\n")
+    return numpy_api
+
+def pcm_enabled():
+    return settings["audio_output"] != "ffplay" and bool(load_numpy())
+
+def decode_command(source, start=0):
+    seek = ["-ss", f"{start:.2f}"] if start else []
+    return ["ffmpeg", "-loglevel", "quiet", *seek, "-i", source, "-vn", "-f", "s16le", "-ac", "2", "-ar", str(pcm_rate), "-"]
+
+class FfplaySink:
+    def __init__(self):
+        command = ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-f", "s16le", "-sample_rate", str(pcm_rate), "-ch_layout", "stereo", "-i", "-"]
+        self.process = TracedPopen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
+    def write(self, buffer):
+        self.process.stdin.write(buffer)
+
+    def close(self, drain=True):
+        try:
+            if drain:
+                self.process.stdin.close()
+            else:
+                self.process.kill()
+        except OSError:
+            pass
+        self.process.wait()
+
+class DeviceSink:
+    def __init__(self):
+        self.stream = sounddevice_api.RawOutputStream(samplerate=pcm_rate, channels=2, dtype="int16")
+        self.stream.start()
+
+    def write(self, buffer):
+        self.stream.write(buffer)
+
+    def close(self, drain=True):
+        if drain:
+            self.stream.stop()
+        else:
+            self.stream.abort()
+        self.stream.close()
+
+def open_sink():
+    global sounddevice_api
+    if sounddevice_api is None:
+        try:
+            import sounddevice
+            sounddevice_api = sounddevice
+        except (ImportError, OSError):
+            sounddevice_api = False
+    if sounddevice_api:
+        try:
+            return DeviceSink()
+        except Exception:
+            pass
+    return FfplaySink()
+
+def block_loudness(energy):
+    return -0.691 + 10 * math.log10(2 * energy / 32768 ** 2) if energy > 0 else -math.inf
+
+def integrated_loudness(histogram):
+    gated = [(energy, count) for energy, count in histogram.values() if count]
+    total = sum(count for _, count in gated)
+    if not total:
+        return None
+    relative = block_loudness(sum(energy for energy, _ in gated) / total) - 10
+    above = [(energy, count) for energy, count in gated if block_loudness(energy / count) > relative]
+    return round(block_loudness(sum(energy for energy, _ in above) / sum(count for _, count in above)), 2)
+
+def render_pcm(reader, sink, start=0, normalization=1.0, measure=False):
+    numpy = numpy_api
+    raw = bytearray(pcm_block_frames * 4)
+    view = memoryview(raw)
+    samples = numpy.frombuffer(raw, dtype=numpy.int16)
+    scaled = numpy.empty(len(samples), dtype=numpy.float32)
+    output = numpy.empty(len(samples), dtype=numpy.int16)
+    histogram = {}
+    peak = 0.0
+    frames = 0
+
+    while True:
+        size = 0
+        while size < len(raw):
+            read = reader.readinto(view[size:])
+            if not read:
+                break
+            size += read
+        count = size // 4 * 2
+        if not count:
+            break
+        if playback["action"] == "pause":
+            playback["resume"].wait()
+            playback["resume"].clear()
+            with playback["lock"]:
+                if playback["action"] == "resume":
+                    playback["action"] = None
+                playback["started"] = time()
+            if playback["action"]:
+                break
+
+        block = scaled[:count]
+        numpy.copyto(block, samples[:count])
+        if measure:
+            energy = float(numpy.dot(block, block)) / count
+            loudness = block_loudness(energy)
+            if loudness > -70:
+                bucket = histogram.setdefault(int(loudness * 10), [0.0, 0])
+                bucket[0] += energy
+                bucket[1] += 1
+            peak = max(peak, float(block.max()), -float(block.min()))
+        block *= int(playback["volume"]) / 100 * normalization
+        numpy.clip(block, -32768, 32767, out=block)
+        numpy.copyto(output[:count], block, casting="unsafe")
+        sink.write(output[:count])
+
+        frames += count // 2
+        playback["offset"] = start + frames / pcm_rate
+        playback["started"] = time()
+
+    if measure and frames >= pcm_rate * 10:
+        lufs = integrated_loudness(histogram)
+        if lufs is not None:
+            return lufs, round(peak / 32768, 4)
+    return None
+
+def play_source(key, source, volume, start=0, stream=None, cache_path=None):
+    stdin = subprocess.PIPE if stream else None
+    if not pcm_enabled():
+        ffplay_options = ["-nodisp", "-autoexit", "-af", f"volume={int(volume)/100}", "-loglevel", "quiet"]
+        if start:
+            ffplay_options += ["-ss", f"{start:.2f}"]
+        with start_player(["ffplay", "-i", source, *ffplay_options], start, stdin=stdin) as player:
+            if stream:
+                return 0 if pump_stream(stream, player, cache_path) else 1
+            return player.wait()
+
+    with start_player(decode_command(source, start), start, live=True, stdin=stdin, stdout=subprocess.PIPE) as decoder, ThreadPoolExecutor(1) as pool:
+        pumped = pool.submit(pump_stream, stream, decoder, cache_path) if stream else None
+        sink = None
+        finished = False
+        try:
+            sink = open_sink()
+            measured = render_pcm(decoder.stdout, sink, start, normalization_gain(key), start == 0 and loudness_lookup(key) is None)
+            finished = True
+        finally:
+            if sink:
+                sink.close(drain=finished and not playback["action"])
+            if not finished or playback["action"]:
+                decoder.kill()
+        if measured:
+            loudness_put(key, *measured, "playback")
+        if pumped:
+            return 0 if pumped.result() else 1
+        return decoder.wait()
+
+playback = {
+    "volume": "100",
+    "track": None,
+    "process": None,
+    "started": 0.0,
+    "offset": 0.0,
+    "action": None,
+    "live": False,
+    "queue": False,
+    "resume": threading.Event(),
+    "lock": threading.Lock(),
+}
+
+def start_player(command, start=0, live=False, **kwargs):
+    kwargs.setdefault("stdout", subprocess.DEVNULL)
+    process = TracedPopen(command, stderr=subprocess.DEVNULL, **kwargs)
+    with playback["lock"]:
+        playback["process"] = process
+        playback["live"] = live
+        playback["started"] = time()
+        playback["offset"] = start
+        if playback["action"]:
+            process.kill()
+    return process
+
+def playback_position():
+    with playback["lock"]:
+        process = playback["process"]
+        if process and process.poll() is None and playback["action"] != "pause":
+            return playback["offset"] + time() - playback["started"]
+        return playback["offset"]
+
+def control_playback(action):
+    with playback["lock"]:
+        if playback["track"] is None:
+            return False
+        if playback["action"] == "pause":
+            if action in ("pause", "volume"):
+                return action == "volume"
+            playback["action"] = action
+            playback["resume"].set()
+            return True
+        if action == "resume":
+            return False
+        if playback["live"] and action in ("pause", "volume"):
+            if action == "pause":
+                playback["action"] = action
+            return True
+        playback["action"] = action
+        process = playback["process"]
+        if process and process.poll() is None:
+            playback["offset"] += time() - playback["started"]
+            process.kill()
+        return True
+
+def play_youtube_audio(url, volume, stream=None, start=0):
     try:
+        local_path = store_lookup(url)
+        if local_path:
+            close_stream(stream)
+            sys.stdout.write(f"{SUCCESS}[playing]: {local_path} at {volume}% volume{RESET}\n")
+            play_source(local_path, local_path, volume, start)
+            return True
+
         sys.stdout.write(f"{SUCCESS}[playing]: streaming audio at {volume}% volume{RESET}\n")
-        with subprocess.Popen(
-            command, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.DEVNULL  
-        ) as yt_process:
-            subprocess.run(
-                ffplay_command, 
-                stdin=yt_process.stdout, 
-                stdout=subprocess.DEVNULL,  
-                stderr=subprocess.DEVNULL   
-            )
+        if stream is None and settings["direct_stream"] and not settings["cache_on_play"]:
+            started = time()
+            direct_url, cached = resolve_stream_url(url)
+            if direct_url:
+                sys.stdout.write(f"{INFO}[ready]: stream resolved in {(time() - started) * 1000:.0f} ms{' (cached)' if cached else ''}{RESET}\n")
+                if play_source(url, direct_url, volume, start) == 0 or playback["action"]:
+                    return True
+                forget_stream_url(url)
+            sys.stdout.write(f"{INFO}[fallback]: direct stream unavailable, piping through yt-dlp{RESET}\n")
+
+        stream = stream or open_stream(url)
+        stream["thread"].join()
+        cache_path = audio_cache_path(url) if settings["cache_on_play"] and not start else None
+        if play_source(url, "-", volume, start, stream, cache_path) == 0 and cache_path:
+            store_put([url], cache_path, cached=True)
+        return True
     except FileNotFoundError:
         sys.stdout.write(f"{ERROR}[error]: ensure yt-dlp and ffmpeg are installed and in your PATH{RESET}\n")
-    except KeyboardInterrupt:
-        sys.stdout.write(f"{ERROR}[stopped]: playback interrupted{RESET}\n")
+    finally:
+        close_stream(stream)
+    return False
+
+def play_track(track, stream=None):
+    with playback["lock"]:
+        playback["track"] = track
+        playback["action"] = None
+        playback["offset"] = 0.0
+    start = 0
+    try:
+        while True:
+            played = play_youtube_audio(track["url"], playback["volume"], stream, start)
+            stream = None
+            if playback["action"] == "pause":
+                sys.stdout.write(f"{INFO}[paused]: {track['label']} at {format_position(playback['offset'])}{RESET}\n")
+                playback["resume"].wait()
+                playback["resume"].clear()
+            with playback["lock"]:
+                action = playback["action"]
+                if action in ("resume", "volume"):
+                    playback["action"] = None
+            if action in ("resume", "volume") and played:
+                start = playback["offset"]
+                continue
+            if action == "stop":
+                sys.stdout.write(f"{ERROR}[stopped]: playback stopped{RESET}\n")
+            return played and action != "stop"
+    finally:
+        with playback["lock"]:
+            playback["track"] = None
+            playback["process"] = None
+            playback["action"] = None
+            playback["live"] = False
+
+def format_position(seconds):
+    return f"{int(seconds) // 60}:{int(seconds) % 60:02d}"
+
+def pump_stream(stream, player, cache_path=None):
+    part_path = None
+    if cache_path:
+        audio_cache_folder.mkdir(parents=True, exist_ok=True)
+        part_path = cache_path.with_suffix(".part")
+
+    complete = False
+    with open_traced(part_path, "wb") if part_path else contextlib.nullcontext() as cache_file:
+        try:
+            chunk = bytes(stream["buffer"])
+            while chunk:
+                if cache_file:
+                    cache_file.write(chunk)
+                player.stdin.write(chunk)
+                chunk = stream["process"].stdout.read1(65536)
+            player.stdin.close()
+            complete = stream["process"].wait() == 0 and player.wait() == 0
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            player.wait()
+    if part_path:
+        if complete:
+            os.replace(part_path, cache_path)
+        else:
+            os.remove(part_path)
+    return complete
+
+def prefetch_track(url):
+    if store_lookup(url):
+        return None
+    if settings["direct_stream"] and not settings["cache_on_play"]:
+        threading.Thread(target=resolve_stream_url, args=(url,), daemon=True).start()
+        return None
+    return open_stream(url)
+
+play_queue = []
+
+def queue_entries(urls, entry_number):
+    if "." in entry_number:
+        playlist_number, track_number = (int(part) for part in entry_number.split("."))
+        if not 1 <= playlist_number <= len(urls):
+            return None
+        track_url = get_track_url(urls[playlist_number - 1][0], track_number)
+        return [{"url": track_url, "label": f"track {playlist_number}.{track_number}"}] if track_url else None
+
+    entry_number = int(entry_number)
+    if not 1 <= entry_number <= len(urls):
+        return None
+    url, title = urls[entry_number - 1]
+    if not title.startswith("[playlist]"):
+        return [{"url": url, "label": title}]
+    entries = playlist_entries(url)
+    if not entries:
+        return None
+    return [
+        {"url": entry.get("url") or entry.get("id"), "label": f"{entry_number}.{index} {entry.get('title', '')}".strip()}
+        for index, entry in enumerate(entries, start=1)
+    ]
 
-def is_playlist(url):
-    command_check = ["yt-dlp", "--flat-playlist", "--dump-single-json", url]
-    result_check = subprocess.run(command_check, capture_output=True, text=True)
-    return result_check
+def print_queue():
+    if not play_queue:
+        sys.stdout.write(f"{HEADER}~ queue is empty ~{RESET}\n")
+        return
+    sys.stdout.write(f"{HEADER}~ up next ~{RESET}\n")
+    for i, track in enumerate(play_queue, start=1):
+        sys.stdout.write(f"{INFO}{i}: {track['label']} ({track['url']}){RESET}\n")
+
+def play_queue_tracks():
+    upcoming = None
+    playback["queue"] = True
+    try:
+        while play_queue:
+            track = play_queue.pop(0)
+            stream = upcoming if upcoming and upcoming["url"] == track["url"] else None
+            if stream is None:
+                close_stream(upcoming)
+            upcoming = prefetch_track(play_queue[0]["url"]) if play_queue else None
+
+            sys.stdout.write(f"{SUCCESS}[selecting]: {track['label']} ({len(play_queue)} left in queue){RESET}\n")
+            if not play_track(track, stream):
+                break
+    finally:
+        playback["queue"] = False
+        close_stream(upcoming)
+
+def play_entry(library, entry_number):
+    try:
+        tracks = queue_entries(library, entry_number)
+    except ValueError:
+        sys.stdout.write(f"{ERROR}[error]: use a valid number after play{RESET}\n")
+        return False
+    if not tracks:
+        if entry_number.isdigit() and 1 <= int(entry_number) <= len(library) and library[int(entry_number) - 1][1].startswith("[playlist]"):
+            sys.stdout.write(f"{ERROR}[error]: could not load playlist {entry_number}{RESET}\n")
+        else:
+            sys.stdout.write(f"{ERROR}[error]: invalid track number{RESET}\n")
+        return False
+    if len(tracks) > 1:
+        play_queue[:] = tracks
+        return play_queue_tracks()
+    sys.stdout.write(f"{SUCCESS}[selecting]: playing track {entry_number}{RESET}\n")
+    return play_track(tracks[0])
+
+def queue_add(library, entry_numbers):
+    for entry_number in entry_numbers:
+        try:
+            tracks = queue_entries(library, entry_number)
+        except ValueError:
+            tracks = None
+        if tracks:
+            play_queue.extend(tracks)
+            sys.stdout.write(f"{SUCCESS}[queued]: {len(tracks)} track(s) from {entry_number}{RESET}\n")
+        else:
+            sys.stdout.write(f"{ERROR}[error]: invalid track number {entry_number}{RESET}\n")
+
+trace_buckets = [(0.001, "<1ms"), (0.01, "<10ms"), (0.1, "<100ms"), (1, "<1s"), (10, "<10s"), (float("inf"), "10s+")]
+
+def format_duration(seconds):
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+def print_stats():
+    with trace_lock:
+        snapshot = {key: list(samples) for key, samples in trace_stats.items()}
+    if not snapshot:
+        sys.stdout.write(f"{INFO}[stats]: nothing recorded yet{RESET}\n")
+        return
+    header = "".join(f"{label:>7}" for _, label in trace_buckets)
+    for kind in ("command", "task", "yt-dlp", "subprocess", "file"):
+        rows = [(key, samples) for (row_kind, key), samples in snapshot.items() if row_kind == kind]
+        if not rows:
+            continue
+        sys.stdout.write(f"{HEADER}{'~ ' + kind + ' ~':<28}{'count':>6}{'p50':>10}{'p95':>10}{'max':>10}{header}{RESET}\n")
+        for key, samples in sorted(rows, key=lambda row: -sum(elapsed for elapsed, _ in row[1])):
+            times = sorted(elapsed for elapsed, _ in samples)
+            counts = [0] * len(trace_buckets)
+            for elapsed in times:
+                counts[next(index for index, (limit, _) in enumerate(trace_buckets) if elapsed < limit)] += 1
+            p50 = times[len(times) // 2]
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            sys.stdout.write(
+                f"{INFO}{key[:27]:<28}{len(times):>6}{format_duration(p50):>10}{format_duration(p95):>10}"
+                f"{format_duration(times[-1]):>10}{''.join(f'{count:>7}' for count in counts)}{RESET}\n"
+            )
+            slowest = max(samples, key=lambda sample: sample[0])[1]
+            if slowest and slowest != key:
+                sys.stdout.write(f"{INFO}    slowest: {slowest[:160]}{RESET}\n")
+
+def print_status(tasks):
+    track = playback["track"]
+    if track is None:
+        sys.stdout.write(f"{INFO}[status]: stopped{RESET}\n")
+    else:
+        state = "paused" if playback["action"] == "pause" else "playing"
+        sys.stdout.write(f"{INFO}[status]: {state} {track['label']} at {format_position(playback_position())}{RESET}\n")
+    sys.stdout.write(f"{INFO}[status]: volume {playback['volume']}%, {len(play_queue)} track(s) in queue{RESET}\n")
+    for task in tasks:
+        sys.stdout.write(f"{INFO}[running]: {task.get_name()}{RESET}\n")
 
 def fetch_video_titles(urls):
+    try:
+        resolved = resolve_metadata(urls)
+    except FileNotFoundError:
+        sys.stdout.write("[error][missing]: yt-dlp is not installed or in your PATH\n")
+        return ["unknown title" for _ in urls]
+    except json.JSONDecodeError:
+        sys.stdout.write("[error]: Failed to parse JSON metadata\n")
+        return ["unknown title" for _ in urls]
+
     titles = []
     for url in urls:
-        try:  
-            result_check = is_playlist(url)          
-            if result_check.returncode == 0:
-                metadata = json.loads(result_check.stdout)
-                if "entries" in metadata:
-                    playlist_title = metadata.get("title", "unknown playlist title")
-                    titles.append("[playlist] " + playlist_title)
-                else:
-                    command_video = ["yt-dlp", "--get-title", url]
-                    result_video = subprocess.run(command_video, capture_output=True, text=True)
-                    if result_video.returncode == 0:
-                        titles.append(result_video.stdout.strip())
-                    else:
-                        titles.append("unknown title")
-            else:
-                titles.append("unknown title")
-        except FileNotFoundError:
-            sys.stdout.write("[error][missing]: yt-dlp is not installed or in your PATH\n")
-            titles.append("unknown title")
-        except json.JSONDecodeError:
-            sys.stdout.write("[error]: Failed to parse JSON metadata\n")
+        metadata = resolved[url]
+        if metadata is None:
             titles.append("unknown title")
+        elif "entries" in metadata:
+            titles.append("[playlist] " + metadata.get("title", "unknown playlist title"))
+        else:
+            titles.append(metadata.get("title") or "unknown title")
     return titles
 
-def list_video_titles(url, playlist_title):
-    sys.stdout.write(f"{INFO}fetching titles...{RESET}\n")
+def list_video_titles(url, playlist_title, page=1, refresh=False):
+    page_size = max(1, int(settings["page_size"]))
+    first, last = (page - 1) * page_size + 1, page * page_size
+    sys.stdout.write(f"{INFO}{playlist_title} (page {page}):{RESET}\n")
+
+    def print_entry(position, entry):
+        if first <= position <= last:
+            sys.stdout.write(f"{INFO}{position}: {entry.get('title') or entry.get('url', 'unknown title')}{RESET}\n")
+            sys.stdout.flush()
+
     try:
-        command_video = ["yt-dlp", "--get-title", url]
-        result_video = subprocess.run(command_video, capture_output=True, text=True)
-        if result_video.returncode == 0:
-            sys.stdout.write(f"{INFO}{playlist_title}:\n{result_video.stdout.strip()}{RESET}\n")
-        else:
+        known = load_playlist_index(url)["entries"]
+        for position, entry in enumerate(known[first - 1:last], start=first):
+            print_entry(position, entry)
+        entries = playlist_entries(url, count=None if refresh else last + 1, on_entry=print_entry, refresh=refresh)
+        if not entries:
             sys.stdout.write("unknown title")
+        elif len(entries) > last:
+            sys.stdout.write(f"{INFO}[more]: add --page {page + 1} for the next page{RESET}\n")
     except FileNotFoundError:
             sys.stdout.write("[error][missing]: yt-dlp is not installed or in your PATH\n")
 
 def clean_title(title):
     return re.sub(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}', '', title).strip()
 
-def add_url(file_path, urls):
+def add_url(library, urls):
+    pending = {}
     for url in urls:
         if not url:
             sys.stdout.write(f"{ERROR}[error]: no URL provided{RESET}\n")
-            continue
-        with open(file_path, 'r') as file:
-            if url in file.read():
-                sys.stdout.write(f"{ERROR}[error]: duplicate url{RESET}\n")
-                continue
-            
-        print(f"{INFO}[loading]: adding {url} to list{RESET}")
-        title = fetch_video_titles([url])[0]
-
-        if title == "unknown title":
-            reprint_entries(file_path)
-            sys.stdout.write(f"{ERROR}[error]: could not fetch title for the URL: {url}{RESET}\n")
-            sleep(1.0)
-            continue
-        
-        print(url, title)
-        with open(file_path, "a") as file:
-            file.write(f"{url} {clean_title(title)}\n")
-        reprint_entries(file_path)
+        elif url in library or normalize_url(url) in pending:
+            sys.stdout.write(f"{ERROR}[error]: duplicate url: {url}{RESET}\n")
+        else:
+            pending[normalize_url(url)] = url
+    pending = list(pending.values())
+
+    if not pending:
+        return
+    workers = max(1, min(int(settings["add_workers"]), len(pending)))
+    print(f"{INFO}[loading]: adding {len(pending)} url(s) with {workers} worker(s){RESET}")
+
+    batches = [pending[i::workers] for i in range(workers)]
+    titles = {}
+    pool = worker_pool("add", settings["add_workers"])
+    for batch, batch_titles in zip(batches, pool.map(fetch_video_titles, batches)):
+        titles.update(zip(batch, batch_titles))
+
+    fetched = [(url, titles[url]) for url in pending if titles[url] != "unknown title"]
+    failed = [url for url in pending if titles[url] == "unknown title"]
+    stored = {url for url, _ in library.add((url, clean_title(title)) for url, title in fetched)}
+    added = [(url, title) for url, title in fetched if url in stored]
+
+    reprint_entries(library)
+    for url, title in added:
         sys.stdout.write(f"{SUCCESS}[added]: {url} ({title}){RESET}\n")
+    for url, _ in fetched:
+        if url not in stored:
+            sys.stdout.write(f"{ERROR}[error]: duplicate url: {url}{RESET}\n")
+    for url in failed:
+        sys.stdout.write(f"{ERROR}[error]: could not fetch title for the URL: {url}{RESET}\n")
+    sys.stdout.write(f"{INFO}[summary]: {len(added)} added, {len(failed)} failed{RESET}\n")
 
-def remove_url(file_path, entry_numbers):
-    entry_numbers.sort(reverse=True)
+def remove_url(library, entry_numbers):
+    valid = set()
     for entry_number in entry_numbers:
         try:
             entry_number = int(entry_number)
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-            
-            if entry_number < 1 or entry_number > len(lines):
-                sys.stdout.write(f"{ERROR}[error]: invalid entry number{RESET}\n")
-                return
-            lines.pop(entry_number - 1)
-            with open(file_path, 'w') as file:
-                file.writelines(lines)
-
         except ValueError:
-            sys.stdout.write(f"{ERROR}[error]: invalid number format{RESET}\n")
-            return
-        except FileNotFoundError:
-            sys.stdout.write(f"{ERROR}[error]: file not found{RESET}\n")
-            return
+            sys.stdout.write(f"{ERROR}[error]: invalid number format: {entry_number}{RESET}\n")
+            continue
+        if entry_number < 1 or entry_number > len(library):
+            sys.stdout.write(f"{ERROR}[error]: invalid entry number: {entry_number}{RESET}\n")
+            continue
+        valid.add(entry_number)
+
+    if not valid:
+        return
+    library.remove(valid)
+    reprint_entries(library)
+    sys.stdout.write(f"{SUCCESS}[removed]: track {', '.join(str(number) for number in sorted(valid))}{RESET}\n")
+
+def reprint_entries(library):
+    display_urls_with_titles(library)
+    if not len(library): sys.stdout.write(f"{HEADER}~ no tracks found ~{RESET}\n")
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
+
+audio_codecs = {
+    "mp3": ("libmp3lame", "mp3"),
+    "aac": ("aac", "m4a"),
+    "opus": ("libopus", "opus"),
+    "vorbis": ("libvorbis", "ogg"),
+    "flac": ("flac", "flac"),
+}
+
+def transcode_file(source, destination):
+    codec, _ = audio_codecs[settings["audio_codec"]]
+    bitrate = [] if codec == "flac" else ["-b:a", settings["audio_bitrate"]]
+    command = ["ffmpeg", "-y", "-i", source, "-vn", "-c:a", codec, *bitrate, "-threads", "1", str(destination)]
+    run_process(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def finish_staged(job, staged_files, staging):
+    final_folder = Path(job["template"]).parent
+    final_folder.mkdir(parents=True, exist_ok=True)
+    files = []
+    try:
+        for staged in map(Path, staged_files):
+            if settings["transcode"]:
+                destination = final_folder / f"{staged.stem}.{audio_codecs[settings['audio_codec']][1]}"
+                transcode_file(str(staged), destination)
+            else:
+                destination = final_folder / staged.name
+                shutil.move(str(staged), destination)
+            files.append(str(destination))
+        return files
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def run_download_jobs(jobs, on_done=None):
+    if not jobs:
+        return []
+    job_queue = queue.Queue()
+    for job in jobs:
+        job.update(attempts=0, downloaded=0, total=0, files=[], error=None)
+        job_queue.put(job)
+
+    lock = threading.Lock()
+    changed = threading.Condition(lock)
+    counts = {"done": 0, "failed": 0}
+    started = time()
+    pipeline = bool(settings["transcode_pipeline"])
+    transcoder = worker_pool("transcode", os.cpu_count() or 1) if pipeline else None
+    tasks = []
+    staging_root = downloads_folder / ".staging"
+
+    def finish(job):
+        with lock:
+            counts["failed" if job["error"] else "done"] += 1
+            if on_done:
+                on_done(job)
+            changed.notify_all()
+
+    def transcode(job, staged_files, staging):
+        try:
+            job["files"] = finish_staged(job, staged_files, staging)
+        except subprocess.CalledProcessError as e:
+            job["error"] = f"ffmpeg failed with error code {e.returncode}"
         except Exception as e:
-            sys.stdout.write(f"{ERROR}[error]: {str(e)}{RESET}\n")
-            return
-        
-        reprint_entries(file_path)
-        sys.stdout.write(f"{SUCCESS}[removed]: track {entry_number}{RESET}\n")
+            job["error"] = str(e)
+        finish(job)
 
-def reprint_entries(file_path):
-    urls = read_urls(file_path)
-    display_urls_with_titles(urls)
-    if not urls: sys.stdout.write(f"{HEADER}~ no tracks found ~{RESET}\n")
+    def worker():
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
 
-download_title = ""    
-def download_url(url, onefile=False):
-    global music_folder, downloads_folder, download_title
+            def progress(downloaded, total):
+                with lock:
+                    job["downloaded"], job["total"] = downloaded, max(total, downloaded)
 
-    download_title = fetch_video_titles([url])[0]
-    is_playlist = download_title.startswith("[playlist]")
+            staging = staging_root / hashlib.sha1(f"{job['template']} {job['url']}".encode()).hexdigest()[:16]
+            template = str(staging / Path(job["template"]).name) if pipeline else job["template"]
+            while True:
+                job["attempts"] += 1
+                try:
+                    job["files"] = engine_download(job["url"], template, progress, extract=not pipeline)
+                    job["error"] = None
+                    break
+                except subprocess.CalledProcessError as e:
+                    job["error"] = f"yt-dlp failed with error code {e.returncode}"
+                except Exception as e:
+                    job["error"] = str(e)
+                if job["attempts"] > int(settings["download_retries"]):
+                    break
+                sleep(min(2 ** job["attempts"], 10))
+
+            if pipeline and not job["error"]:
+                tasks.append(transcoder.submit(transcode, job, job["files"], staging))
+            else:
+                finish(job)
 
-    def get_unique_foldername(base_path, base_name="playlist"):
-        global download_title
+    def report():
+        with lock:
+            finished = counts["done"] + counts["failed"]
+            downloaded = sum(job["downloaded"] for job in jobs)
+        elapsed = time() - started
+        eta = f"{(elapsed / finished) * (len(jobs) - finished):.0f}s" if finished else "--"
+        rate = format_size(downloaded / elapsed) + "/s" if elapsed > 0 else "--"
+        sys.stdout.write(f"\r{INFO}[progress]: {finished}/{len(jobs)} tracks, {format_size(downloaded)} at {rate}, eta {eta}{RESET}   ")
+        sys.stdout.flush()
+        return finished
 
-        folder = base_path / base_name
-        counter = 1
-        while folder.exists():
-            folder = base_path / f"{base_name}_{counter}"
-            counter += 1
+    downloader = worker_pool("download", settings["download_workers"])
+    tasks.extend(downloader.submit(worker) for _ in range(max(1, min(int(settings["download_workers"]), len(jobs)))))
+    def settled():
+        return counts["done"] + counts["failed"] >= len(jobs) or all(task.done() for task in list(tasks))
 
+    while True:
+        with changed:
+            if changed.wait_for(settled, timeout=0.5):
+                break
+        report()
+    if transcoder:
         try:
-            folder.mkdir(parents=True, exist_ok=True)
-        except:
-            sys.stdout.write(f"{ERROR}[error]: video name invalid{RESET}\n")
-            sys.stdout.write(f"{INFO}[default]: using 'placeholder'{RESET}\n")
-            folder = base_path / "placeholder"
-            download_title = "placeholder"
+            staging_root.rmdir()
+        except OSError:
+            pass
+    report()
+    sys.stdout.write("\n")
 
-        return folder
-    
-    if is_playlist:
+    for job in jobs:
+        if job["error"]:
+            sys.stdout.write(f"{ERROR}[error]: {job['label']} failed after {job['attempts']} attempt(s): {job['error']}{RESET}\n")
+    return [job for job in jobs if not job["error"]]
+
+def get_unique_foldername(base_path, base_name="playlist"):
+    folder = base_path / base_name
+    counter = 1
+    while folder.exists():
+        folder = base_path / f"{base_name}_{counter}"
+        counter += 1
+
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+    except:
+        sys.stdout.write(f"{ERROR}[error]: video name invalid{RESET}\n")
+        sys.stdout.write(f"{INFO}[default]: using 'placeholder'{RESET}\n")
+        folder = base_path / "placeholder"
+        folder.mkdir(parents=True, exist_ok=True)
+
+    return folder
+
+def plan_download(url, onefile=False):
+    download_title = fetch_video_titles([url])[0]
+    metadata = fetch_metadata(url)
+    if metadata is None:
+        sys.stdout.write(f"{ERROR}[error]: could not fetch metadata for {url}{RESET}\n")
+        return None
+
+    plan = {"url": url, "title": download_title, "onefile": onefile, "playlist": "entries" in metadata, "jobs": []}
+    if plan["playlist"]:
         target_folder = get_unique_foldername(downloads_folder, download_title) if onefile else downloads_folder / download_title
         target_folder.mkdir(parents=True, exist_ok=True)
-        output_template = str(target_folder / "track%(playlist_index)03d.%(ext)s") if onefile else str(target_folder / "%(title)s.%(ext)s")
+        plan["folder"] = target_folder
+        for index, entry in enumerate(metadata["entries"], start=1):
+            template = str(target_folder / f"track{index:03d}.%(ext)s") if onefile else str(target_folder / "%(title)s.%(ext)s")
+            entry_url = entry.get("url") or entry.get("id")
+            plan["jobs"].append({
+                "url": entry_url, "template": template, "label": f"{download_title} #{index}",
+                "store_keys": [entry_url],
+            })
     else:
-        output_template = str(downloads_folder / "%(title)s.%(ext)s")
+        plan["folder"] = downloads_folder
+        plan["jobs"].append({
+            "url": url, "template": str(downloads_folder / "%(title)s.%(ext)s"), "label": download_title,
+            "store_keys": [url],
+        })
 
-    command = [
-        "yt-dlp", "--extract-audio", "--audio-format", "mp3",
-        "--output", output_template, url
-    ]
+    download_type = "playlist as onefile" if plan["playlist"] and onefile else "playlist" if plan["playlist"] else "track"
+    print(f"{INFO}[downloading {download_type}]: {url} ({len(plan['jobs'])} job(s)){RESET}")
+    return plan
 
-    try:
-        download_type = "playlist as onefile" if is_playlist and onefile else "playlist" if is_playlist else "track"
-        print(f"{INFO}[downloading {download_type}]: {url}{RESET}")
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        if is_playlist and onefile:
-            target_folder = Path(str(target_folder))
-            mp3_files = sorted(str(mp3) for mp3 in target_folder.glob("*.mp3"))
-            
-            if mp3_files:
-                merged_file = str(downloads_folder / f"{download_title}.mp3")
-                merge_mp3s(mp3_files, merged_file)
+def finish_download(plan, merge=True, normalize=False):
+    files = [file for job in plan["jobs"] if not job["error"] for file in job["files"]]
+    plan["files"] = files
+    if plan["playlist"] and plan["onefile"] and merge:
+        target_folder = plan["folder"]
+        mp3_files = files
+
+        if mp3_files:
+            merged_file = str(downloads_folder / f"{plan['title']}.mp3")
+            if merge_mp3s(mp3_files, merged_file, normalize):
+                plan["files"] = [merged_file]
                 sys.stdout.write(f"{SUCCESS}[completed]: Merged playlist saved to {merged_file}{RESET}\n")
                 shutil.rmtree(target_folder)
                 sys.stdout.write(f"{INFO}[cleanup]: Temporary folder {target_folder} deleted{RESET}\n")
-            else:
-                sys.stdout.write(f"{ERROR}[error]: No MP3 files found to merge in {target_folder}{RESET}\n")
         else:
-            sys.stdout.write(f"{SUCCESS}[completed]: Download saved to {target_folder if is_playlist else downloads_folder}{RESET}\n")
+            sys.stdout.write(f"{ERROR}[error]: No MP3 files found to merge in {target_folder}{RESET}\n")
+    elif files and not plan["onefile"]:
+        for job in plan["jobs"]:
+            if not job["error"] and job["files"]:
+                store_put(job["store_keys"], job["files"][-1])
+        sys.stdout.write(f"{SUCCESS}[completed]: Download saved to {plan['folder']}{RESET}\n")
+    return plan
 
-    except subprocess.CalledProcessError as e:
-        sys.stdout.write(f"{ERROR}[error]: yt-dlp failed with error code {e.returncode}{RESET}\n")
+def download_urls(urls, onefile=False, merge=True, normalize=False):
+    try:
+        plans = [plan for plan in (plan_download(url, onefile) for url in urls) if plan]
+        run_download_jobs([job for plan in plans for job in plan["jobs"]])
+        return [finish_download(plan, merge, normalize) for plan in plans]
     except FileNotFoundError:
         sys.stdout.write(f"{ERROR}[missing]: yt-dlp is not installed or in your PATH{RESET}\n")
     except Exception as e:
         sys.stdout.write(f"{ERROR}[error]: An unexpected error occurred: {e}{RESET}\n")
+    return []
+
+def download_url(url, onefile=False):
+    plans = download_urls([url], onefile)
+    return plans[0]["files"] if plans else []
+
+def load_manifest(folder, url):
+    manifest_path = folder / ".sync.json"
+    if manifest_path.exists():
+        try:
+            with open_traced(manifest_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except Exception as e:
+            sys.stdout.write(f"{ERROR}[error]: could not read sync manifest: {e}{RESET}\n")
+    return {"url": url, "entries": {}}
+
+def save_manifest(folder, manifest):
+    manifest_path = folder / ".sync.json"
+    temp_file = manifest_path.with_suffix(".tmp")
+    with open_traced(temp_file, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temp_file, manifest_path)
+
+def sync_playlist(url, prune=False):
+    title = fetch_video_titles([url])[0]
+    if not title.startswith("[playlist]"):
+        sys.stdout.write(f"{ERROR}[error]: sync needs a playlist URL: {url}{RESET}\n")
+        return
+
+    entries = []
+    complete = True
+    try:
+        for entry in stream_playlist_entries(url, 1):
+            entries.append(entry)
+    except subprocess.CalledProcessError:
+        complete = False
+    if not entries:
+        sys.stdout.write(f"{ERROR}[error]: could not list playlist entries for {url}{RESET}\n")
+        return
+    if complete:
+        seed_playlist_index(url, entries)
+    else:
+        sys.stdout.write(f"{ERROR}[error]: yt-dlp stopped listing {url} after {len(entries)} entries, syncing those without pruning{RESET}\n")
+
+    folder = downloads_folder / title
+    folder.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(folder, url)
+    synced = manifest["entries"]
+
+    jobs = []
+    for index, entry in enumerate(entries, start=1):
+        record = synced.get(entry.get("id"))
+        if record and record["status"] == "done" and os.path.exists(record["file"]):
+            record["position"] = index
+            continue
+        entry_url = entry.get("url") or entry.get("id")
+        jobs.append({
+            "url": entry_url, "template": str(folder / "%(title)s.%(ext)s"), "label": f"{title} #{index}",
+            "store_keys": [entry_url], "id": entry.get("id"), "position": index,
+        })
+
+    removed = set(synced) - {entry.get("id") for entry in entries} if complete else set()
+    sys.stdout.write(f"{INFO}[syncing]: {title}: {len(entries) - len(jobs)} up to date, {len(jobs)} to fetch, {len(removed)} removed upstream{RESET}\n")
+
+    def record_job(job):
+        if job["error"] or not job["files"]:
+            synced[job["id"]] = {"file": "", "status": "failed", "position": job["position"]}
+        else:
+            synced[job["id"]] = {"file": job["files"][-1], "status": "done", "position": job["position"]}
+            store_put(job["store_keys"], job["files"][-1])
+        save_manifest(folder, manifest)
+
+    if jobs:
+        run_download_jobs(jobs, on_done=record_job)
 
-def merge_mp3s(mp3_files, output_file):
+    if prune:
+        for entry_id in removed:
+            file = synced.pop(entry_id)["file"]
+            if file and os.path.exists(file):
+                os.remove(file)
+                sys.stdout.write(f"{INFO}[pruned]: {file}{RESET}\n")
+    save_manifest(folder, manifest)
+
+    failed = sum(1 for record in synced.values() if record["status"] == "failed")
+    sys.stdout.write(f"{SUCCESS}[synced]: {folder} ({len(synced) - failed} tracks, {failed} failed){RESET}\n")
+
+def probe_audio_format(file_path):
+    result = run_process(["ffmpeg", "-hide_banner", "-i", file_path], capture_output=True, text=True)
+    match = re.search(r"Audio: (\w+)[^,\n]*, (\d+) Hz, ([^,\n]+)", result.stderr)
+    return match.groups() if match else None
+
+def concat_files(files, output_file, copy=True):
+    if not copy:
+        inputs = [arg for file in files for arg in ("-i", str(file))]
+        chains = "".join(f"[{index}:a]aresample=44100,aformat=channel_layouts=stereo[a{index}];" for index in range(len(files)))
+        labels = "".join(f"[a{index}]" for index in range(len(files)))
+        graph = f"{chains}{labels}concat=n={len(files)}:v=0:a=1[out]"
+        command = ["ffmpeg", "-y", *inputs, "-filter_complex", graph, "-map", "[out]", "-c:a", "libmp3lame", "-q:a", "2", str(output_file)]
+        run_process(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as list_file:
+        for file in files:
+            escaped = str(Path(file).resolve()).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    command = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file.name, "-vn", "-c", "copy", str(output_file)]
+    try:
+        run_process(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    finally:
+        os.unlink(list_file.name)
+
+def level_file(source, destination, gain):
+    command = [
+        "ffmpeg", "-y", "-i", source, "-vn", "-af", f"volume={gain:.2f}dB", "-ar", "44100", "-ac", "2",
+        "-c:a", "libmp3lame", "-b:a", settings["audio_bitrate"], "-threads", "1", destination
+    ]
+    run_process(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return destination
+
+def level_files(files, staging, workers):
+    results, _, _ = analyze_files(files)
+    gains = []
+    for file in files:
+        entry = results.get(str(file))
+        gain = 0.0
+        if entry and entry["lufs"] is not None:
+            gain = float(settings["target_loudness"]) - entry["lufs"]
+            if entry["peak"] > 0:
+                gain = min(gain, -20 * math.log10(entry["peak"]))
+        gains.append(gain)
+    destinations = [str(Path(staging) / f"level{index:05d}.mp3") for index in range(len(files))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(level_file, files, destinations, gains))
+
+def merge_mp3s(mp3_files, output_file, normalize=False):
     try:
-        command = ["ffmpeg", "-y", "-i", f"concat:{'|'.join(mp3_files)}", "-acodec", "libmp3lame", output_file]
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        workers = os.cpu_count() or 1
+        with tempfile.TemporaryDirectory(dir=Path(output_file).parent) as staging:
+            if normalize:
+                sys.stdout.write(f"{INFO}[merging]: levelling tracks to {settings['target_loudness']} LUFS{RESET}\n")
+                mp3_files = level_files(mp3_files, staging, workers)
+                copy = True
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    formats = set(pool.map(probe_audio_format, mp3_files))
+                copy = len(formats) == 1 and None not in formats and next(iter(formats))[0] == "mp3"
+                if not copy:
+                    sys.stdout.write(f"{INFO}[merging]: tracks differ in format, re-encoding{RESET}\n")
+
+            group_size = max(2, int(settings["merge_group_size"]))
+            if len(mp3_files) <= group_size:
+                concat_files(mp3_files, output_file, copy)
+                return True
+
+            groups = [mp3_files[i:i + group_size] for i in range(0, len(mp3_files), group_size)]
+            parts = [str(Path(staging) / f"part{index:04d}.mp3") for index in range(len(groups))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(concat_files, groups, parts, [copy] * len(groups)))
+            concat_files(parts, output_file, copy=True)
+        return True
     except subprocess.CalledProcessError as e:
         print(f"{ERROR}[error]: Failed to merge MP3s with error code {e.returncode}{RESET}")
     except FileNotFoundError:
         print(f"{ERROR}[missing]: ffmpeg is not installed or in your PATH{RESET}")
+    return False
 
-def main():
-    print(f"{INFO}Music Player is loading...{RESET}")
+def get_unique_filename(folder, base_name="playlist", extension=".mp3"):
+    counter = 1
+    unique_name = folder / f"{base_name}{extension}"
+    while unique_name.exists():
+        unique_name = folder / f"{base_name}_{counter}{extension}"
+        counter += 1
+    return unique_name
+
+def download_and_merge(video_urls, onefile=False, normalize=False):
+    fetch_video_titles(video_urls)
+    onefile = onefile and (len(video_urls) > 1 or fetch_video_titles([video_urls[0]])[0].startswith("[playlist]"))
+    merge_all = onefile and len(video_urls) > 1
+    plans = download_urls(video_urls, onefile=onefile, merge=not merge_all, normalize=normalize)
+    mp3_files = [file for plan in plans for file in plan["files"]]
+
+    if merge_all and mp3_files:
+        merged_playlist = get_unique_filename(downloads_folder)
+        if merge_mp3s(mp3_files, str(merged_playlist), normalize):
+            sys.stdout.write(f"{SUCCESS}[completed]: Merged tracks saved to {merged_playlist}{RESET}\n")
+            try:
+                for mp3 in mp3_files:
+                    Path(mp3).unlink()
+                for plan in plans:
+                    if plan["playlist"]:
+                        shutil.rmtree(plan["folder"])
+                sys.stdout.write(f"{INFO}[cleanup]: Temporary files and folder removed{RESET}\n")
+            except Exception as e:
+                sys.stdout.write(f"{ERROR}[error]: Failed to clean up temporary files: {e}{RESET}\n")
+
+def sync_targets(library, targets, prune=False):
+    for target in targets:
+        if target.isdigit() and 1 <= int(target) <= len(library):
+            target = library[int(target) - 1][0]
+        try:
+            sync_playlist(target, prune)
+        except FileNotFoundError:
+            sys.stdout.write(f"{ERROR}[missing]: yt-dlp is not installed or in your PATH{RESET}\n")
+
+def parse_flags(choice, valid_flags):
+    flags = set()
+    for part in choice.split():
+        if part in valid_flags:
+            flags.add(part)
+        elif part.startswith("-"):
+            sys.stdout.write(f"{ERROR}[error]: invalid flag '{part}'{RESET}\n")
+    return flags
+
+def read_command(prompt):
+    if sys.stdin.isatty():
+        return input(prompt)
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = sys.stdin.buffer.raw.readline()
+    if not line:
+        raise EOFError
+    return line.decode(errors="replace").rstrip("\r\n")
+
+def read_commands(loop, commands, ready):
+    while True:
+        ready.wait()
+        ready.clear()
+        try:
+            choice = read_command(f"\n{PROMPT}~ volume: {playback['volume']}% ~\n~ ready to play? type help for commands ~\n> {RESET}")
+        except (EOFError, ValueError):
+            choice = None
+        try:
+            loop.call_soon_threadsafe(commands.put_nowait, choice)
+        except RuntimeError:
+            return
+        if choice is None:
+            return
+
+def run_in_background(session, name, function, *args):
+    started = perf_counter()
+    task = asyncio.ensure_future(asyncio.to_thread(function, *args))
+    task.set_name(name)
+    session["tasks"].add(task)
+    spawned = request_tasks.get()
+    if spawned is not None:
+        spawned.append(task)
+
+    def finished(task):
+        session["tasks"].discard(task)
+        record_span("task", name.split()[0], started, name)
+        if not task.cancelled() and task.exception():
+            sys.stdout.write(f"{ERROR}[error]: {name} failed: {task.exception()}{RESET}\n")
+
+    task.add_done_callback(finished)
+    return task
+
+async def stop_player(session):
+    player = session["player"]
+    if player and not player.done():
+        control_playback("stop")
+        await asyncio.wait([player])
+
+async def start_player_task(session, name, function, *args):
+    await stop_player(session)
+    session["player"] = run_in_background(session, name, function, *args)
+
+command_names = {
+    "help", "play", "pause", "stop", "status", "queue", "shuffle", "next", "add", "remove", "ls", "find",
+    "volume", "download", "sync", "analyze", "stats", "cache", "exit",
+}
+
+async def run_command(choice, session):
+    name = choice.split()[0] if choice.split() else ""
+    with trace_span("command", name if name in command_names else "unknown", choice):
+        return await handle_command(choice, session)
+
+async def handle_command(choice, session):
+    urls = session["urls"]
+
+    if choice == "help":
+        sys.stdout.write(f"\n{HEADER}[commands]{RESET}\n")
+        sys.stdout.write(f"{INFO}help                      : see this menu{RESET}\n")
+        sys.stdout.write(f"{INFO}play [number]             : play a track{RESET}\n")
+        sys.stdout.write(f"{INFO}play [number.number]      : play a track from a playlist{RESET}\n")
+        sys.stdout.write(f"{INFO}pause                     : pause playback, run again to resume{RESET}\n")
+        sys.stdout.write(f"{INFO}stop                      : stop playback{RESET}\n")
+        sys.stdout.write(f"{INFO}status                    : show what is playing and what runs in the background{RESET}\n")
+        sys.stdout.write(f"{INFO}queue                     : show upcoming tracks{RESET}\n")
+        sys.stdout.write(f"{INFO}queue add [number,...]    : queue tracks, playlists or number.number{RESET}\n")
+        sys.stdout.write(f"{INFO}queue clear               : empty the queue{RESET}\n")
+        sys.stdout.write(f"{INFO}next                      : skip to the next track in the queue{RESET}\n")
+        sys.stdout.write(f"{INFO}shuffle                   : shuffle the queue{RESET}\n")
+        sys.stdout.write(f"{INFO}add [url]                 : add a track{RESET}\n")
+        sys.stdout.write(f"{INFO}remove [number,number(?)] : delete a track by its number{RESET}\n")
+        sys.stdout.write(f"{INFO}ls                        : show all tracks{RESET}\n")
+        sys.stdout.write(f"{INFO}ls [number] (--page N)    : show tracks in a playlist, a page at a time{RESET}\n")
+        sys.stdout.write(f"{INFO}ls [number] --refresh     : also fetch entries added to the playlist since{RESET}\n")
+        sys.stdout.write(f"{INFO}find [text] (--page N)    : search track and playlist titles{RESET}\n")
+        sys.stdout.write(f"{INFO}volume [number]           : set audio volume (0 to 200){RESET}\n")
+        sys.stdout.write(f"{INFO}download [url,url(?)]     : download tracks as mp3{RESET}\n")
+        sys.stdout.write(f"{INFO}sync [url,number(?)]      : download only new or failed playlist tracks{RESET}\n")
+        sys.stdout.write(f"{INFO}analyze (folder)          : measure loudness of new or changed downloads{RESET}\n")
+        sys.stdout.write(f"{INFO}stats (clear)             : show or reset timings of commands, subprocesses and file access{RESET}\n")
+        sys.stdout.write(f"{INFO}cache stats               : show metadata cache usage{RESET}\n")
+        sys.stdout.write(f"{INFO}cache clear               : forget all cached metadata{RESET}\n")
+        sys.stdout.write(f"{INFO}exit                      : close the program{RESET}\n")
+        sys.stdout.write(f"\n{HEADER}[flags]{RESET}\n")
+        sys.stdout.write(f"{INFO}-onefile                  : downloads a playlist as one file and/or joins other tracks provided{RESET}\n")
+        sys.stdout.write(f"{INFO}-prune                    : with sync, delete tracks removed from the playlist{RESET}\n")
+        sys.stdout.write(f"{INFO}-normalize                : with -onefile, level every track to target_loudness before joining{RESET}\n")
+
+    elif choice.startswith("play"):
+        parts = choice.split()
+        if len(parts) == 2:
+            await start_player_task(session, f"play {parts[1]}", play_entry, urls, parts[1])
+        else:
+            sys.stdout.write(f"{ERROR}[error]: use a valid number after play{RESET}\n")
+
+    elif choice == "pause":
+        if not control_playback("pause") and not control_playback("resume"):
+            sys.stdout.write(f"{ERROR}[error]: nothing is playing{RESET}\n")
+
+    elif choice == "stop":
+        if session["player"] and not session["player"].done():
+            await stop_player(session)
+        else:
+            sys.stdout.write(f"{ERROR}[error]: nothing is playing{RESET}\n")
+
+    elif choice == "status":
+        print_status(session["tasks"])
+
+    elif choice.startswith("queue"):
+        parts = choice.split(maxsplit=2)
+        if choice == "queue":
+            print_queue()
+        elif choice == "queue clear":
+            play_queue.clear()
+            sys.stdout.write(f"{SUCCESS}[cleared]: queue emptied{RESET}\n")
+        elif len(parts) == 3 and parts[1] == "add":
+            run_in_background(session, choice, queue_add, urls, parts[2].split(","))
+        else:
+            sys.stdout.write(f"{ERROR}[error]: use queue, queue add [number,number.number(?)] or queue clear{RESET}\n")
+
+    elif choice == "shuffle":
+        random.shuffle(play_queue)
+        print_queue()
+
+    elif choice == "next":
+        if session["player"] and not session["player"].done() and playback["queue"]:
+            control_playback("skip")
+        elif play_queue:
+            await start_player_task(session, "queue", play_queue_tracks)
+        else:
+            sys.stdout.write(f"{ERROR}[error]: queue is empty{RESET}\n")
+
+    elif choice.startswith("add"):
+        try:
+            _, new_urls = choice.split(maxsplit=1)
+            run_in_background(session, "add", add_url, urls, new_urls.split(","))
+        except ValueError:
+            sys.stdout.write(f"{ERROR}[error]: provide a URL after -add{RESET}\n")
+
+    elif choice.startswith("remove"):
+        try:
+            _, entry_numbers = choice.split()
+            remove_url(urls, entry_numbers.split(","))
+        except ValueError:
+            sys.stdout.write(f"{ERROR}[error]: provide a valid number after -remove{RESET}\n")
+
+    elif choice.startswith("ls"):
+        if choice == "ls":
+            reprint_entries(urls)
+        else:
+            match = re.fullmatch(r"ls\s+(\d+)((?:\s+--page\s+\d+|\s+--refresh)*)", choice.strip())
+            if match:
+                entry_number = int(match.group(1))
+                page = re.search(r"--page\s+(\d+)", match.group(2))
+                if 1 <= entry_number <= len(urls):
+                    selected_title = urls[entry_number - 1][1]
+                    selected_url = urls[entry_number - 1][0]
+                    if selected_title.startswith("[playlist]"):
+                        run_in_background(session, choice, list_video_titles, selected_url, selected_title, max(1, int(page.group(1))) if page else 1, "--refresh" in match.group(2))
+                    else:
+                        sys.stdout.write(f"{ERROR}[error]: provide a number of a playlist{RESET}\n")
+                else:
+                    sys.stdout.write(f"{ERROR}[error]: invalid track number{RESET}\n")
+            else:
+                sys.stdout.write(f"{ERROR}[error]: provide a valid number after -ls{RESET}\n")
+
+    elif choice.startswith("find"):
+        match = re.fullmatch(r"find\s+(.+?)(?:\s+--page\s+(\d+))?", choice.strip())
+        if match:
+            find_tracks(urls, match.group(1), max(1, int(match.group(2) or 1)))
+        else:
+            sys.stdout.write(f"{ERROR}[error]: provide a search term after find{RESET}\n")
+
+    elif choice.startswith("volume"):
+        try:
+            _, new_volume = choice.split()
+            if 0 <= int(new_volume) <= 200:
+                write_file(session["config_file"], new_volume)
+                playback["volume"] = new_volume
+                control_playback("volume")
+                sys.stdout.write(f"{SUCCESS}[updated]: volume is now {new_volume}%{RESET}\n")
+            else:
+                sys.stdout.write(f"{ERROR}[error]: volume must be between 0 and 200{RESET}\n")
+        except ValueError:
+            sys.stdout.write(f"{ERROR}[error]: enter a valid number{RESET}\n")
+
+    elif choice.startswith("download"):
+        video_urls = choice.split()[-1].split(",")
+        flags = parse_flags(choice, {"-onefile", "-normalize"})
+        run_in_background(session, "download", download_and_merge, video_urls, "-onefile" in flags, "-normalize" in flags)
+
+    elif choice.startswith("sync"):
+        targets = [part for part in choice.split()[1:] if not part.startswith("-")]
+        if not targets:
+            sys.stdout.write(f"{ERROR}[error]: provide playlist URLs or numbers after sync{RESET}\n")
+        else:
+            prune = "-prune" in parse_flags(choice, {"-prune"})
+            run_in_background(session, "sync", sync_targets, urls, targets[0].split(","), prune)
+
+    elif choice == "analyze" or choice.startswith("analyze "):
+        folder = choice[len("analyze"):].strip() or None
+        run_in_background(session, "analyze", analyze_library, folder)
+
+    elif choice == "stats":
+        print_stats()
+
+    elif choice == "stats clear":
+        with trace_lock:
+            trace_stats.clear()
+        sys.stdout.write(f"{SUCCESS}[cleared]: timings reset{RESET}\n")
 
+    elif choice.startswith("cache"):
+        if choice == "cache stats":
+            print_cache_stats()
+        elif choice == "cache clear":
+            clear_metadata_cache()
+            with stream_lock:
+                stream_cache.clear()
+                save_stream_cache()
+            sys.stdout.write(f"{SUCCESS}[cleared]: metadata cache emptied{RESET}\n")
+        else:
+            sys.stdout.write(f"{ERROR}[error]: use cache stats or cache clear{RESET}\n")
+
+    elif choice == "exit":
+        sys.stdout.write(f"{SUCCESS}[exit]: shutting down{RESET}\n")
+        return False
+
+    else:
+        sys.stdout.write(f"{ERROR}[error]: unrecognized command{RESET}\n")
+    return True
+
+def open_session():
     url_file = resolve_path("urls.txt")
     config_file = resolve_path("config.txt")
-    global music_folder
-    global downloads_folder
+    settings_file = resolve_path("settings.json")
+
+    read_settings(settings_file)
+    load_metadata_cache()
+    load_stream_cache()
+    load_store()
+    load_loudness()
+    if settings["library_backend"] == "sqlite":
+        urls = SqliteLibrary(url_file, resolve_path("library.db"))
+        playlist_listeners.append(urls.index_playlist)
+    else:
+        urls = Library(url_file)
+    playback["volume"] = read_file(config_file)
+    return {"urls": urls, "config_file": config_file, "tasks": set(), "player": None}
 
-    urls = read_urls(url_file)
+async def close_session(session):
+    await stop_player(session)
+    pending = [task for task in session["tasks"] if not task.done()]
+    if pending:
+        sys.stdout.write(f"{INFO}[exit]: waiting for {len(pending)} background task(s) to finish{RESET}\n")
+        await asyncio.wait(pending)
+    session["urls"].flush()
 
-    if not urls:
-        sys.stdout.write(f"{HEADER}~ no tracks found ~{RESET}\n")
-        
-    reprint_entries(url_file)
+async def repl():
+    print(f"{INFO}Music Player is loading...{RESET}")
+    session = open_session()
+    reprint_entries(session["urls"])
+
+    commands = asyncio.Queue()
+    ready = threading.Event()
+    threading.Thread(target=read_commands, args=(asyncio.get_running_loop(), commands, ready), daemon=True).start()
 
     try:
         while True:
-            volume = read_file(config_file)
-            urls = read_urls(url_file)
-            choice = input(f"\n{PROMPT}~ volume: {volume}% ~\n~ ready to play? type help for commands ~\n> {RESET}")
-
-            def parse_flags(choice, valid_flags):
-                parts = choice.split()
-                flags = set()
-                urls = None
-
-                for i, part in enumerate(parts):
-                    if part in valid_flags:
-                        flags.add(part)
-                    elif part.startswith("-"):
-                        sys.stdout.write(f"{ERROR}[error]: invalid flag '{part}'{RESET}\n")
-
-                return flags
-            
-            if choice == "help":
-                sys.stdout.write(f"\n{HEADER}[commands]{RESET}\n")
-                sys.stdout.write(f"{INFO}help                      : see this menu{RESET}\n")
-                sys.stdout.write(f"{INFO}play [number]             : play a track{RESET}\n")
-                sys.stdout.write(f"{INFO}play [number.number]      : play a track from a playlist{RESET}\n")
-                sys.stdout.write(f"{INFO}CTRL + C                  : play a track{RESET}\n")
-                sys.stdout.write(f"{INFO}add [url]                 : add a track{RESET}\n")
-                sys.stdout.write(f"{INFO}remove [number,number(?)] : delete a track by its number{RESET}\n")
-                sys.stdout.write(f"{INFO}ls                        : show all tracks{RESET}\n")
-                sys.stdout.write(f"{INFO}ls [number]               : show all tracks in a playlist{RESET}\n")
-                sys.stdout.write(f"{INFO}volume [number]           : set audio volume (0 to 200){RESET}\n")
-                sys.stdout.write(f"{INFO}download [url,url(?)]     : download tracks as mp3{RESET}\n")
-                sys.stdout.write(f"{INFO}exit                      : close the program{RESET}\n")
-                sys.stdout.write(f"\n{HEADER}[flags]{RESET}\n")
-                sys.stdout.write(f"{INFO}-onefile                  : downloads a playlist as one file and/or joins other tracks provided{RESET}\n")
-
-            elif choice.startswith("play"):
-                try:
-                    _, entry_number = choice.split()
-                    if "." in entry_number:
-                        playlist_number, track_number = entry_number.split(".")
-                        playlist_number = int(playlist_number)
-                        track_number = int(track_number)
-                        if 1 <= playlist_number <= len(urls):
-                            selected_url = get_track_url(urls[playlist_number - 1][0], track_number)
-                            sys.stdout.write(f"{SUCCESS}[selecting]: playing track {playlist_number}.{track_number}{RESET}\n")
-                            play_youtube_audio(selected_url, volume)
-                        else:
-                            sys.stdout.write(f"{ERROR}[error]: invalid track number{RESET}\n")
-                    else:
-                        entry_number = int(entry_number)
-                        if 1 <= entry_number <= len(urls):
-                            selected_url = urls[entry_number - 1][0]
-                            sys.stdout.write(f"{SUCCESS}[selecting]: playing track {entry_number}{RESET}\n")
-                            play_youtube_audio(selected_url, volume)
-                        else:
-                            sys.stdout.write(f"{ERROR}[error]: invalid track number{RESET}\n")
-                except ValueError:
-                    sys.stdout.write(f"{ERROR}[error]: use a valid number after play{RESET}\n")
-
-            elif choice.startswith("add"):
-                try:
-                    _, new_urls = choice.split(maxsplit=1)
-                    add_url(url_file, new_urls.split(","))
-                except ValueError:
-                    print(ValueError)
-                    sys.stdout.write(f"{ERROR}[error]: provide a URL after -add{RESET}\n")
-
-            elif choice.startswith("remove"):
-                try:
-                    _, entry_numbers = choice.split()
-                    remove_url(url_file, entry_numbers.split(","))
-                except ValueError:
-                    sys.stdout.write(f"{ERROR}[error]: provide a valid number after -remove{RESET}\n")
-
-            elif choice.startswith("ls"):
-                if choice == "ls":
-                    reprint_entries(url_file)
-                else:
-                    try:
-                        _, entry_number = choice.split() 
-                        entry_number = int(entry_number)
-                        if 1 <= entry_number <= len(urls):
-                            selected_title = urls[entry_number - 1][1]
-                            selected_url = urls[entry_number - 1][0]
-                            if selected_title.startswith("[playlist]"):
-                                list_video_titles(selected_url, selected_title)
-                            else:
-                                sys.stdout.write(f"{ERROR}[error]: provide a number of a playlist{RESET}\n")
-                        else:
-                            sys.stdout.write(f"{ERROR}[error]: invalid track number{RESET}\n")
-                    except ValueError:
-                        sys.stdout.write(f"{ERROR}[error]: provide a valid number after -ls{RESET}\n")
-
-            elif choice.startswith("volume"):
-                try:
-                    _, new_volume = choice.split()
-                    if 0 <= int(new_volume) <= 200:
-                        write_file(config_file, new_volume)
-                        sys.stdout.write(f"{SUCCESS}[updated]: volume is now {new_volume}%{RESET}\n")
-                    else:
-                        sys.stdout.write(f"{ERROR}[error]: volume must be between 0 and 200{RESET}\n")
-                except ValueError:
-                    sys.stdout.write(f"{ERROR}[error]: enter a valid number{RESET}\n")
-
-            elif choice.startswith("download"):
-                video_urls = choice.split()[-1].split(",")
-                onefile = parse_flags(choice, {"-onefile"}) and (len(video_urls) > 1 or fetch_video_titles([video_urls[0]])[0].startswith("[playlist]"))
-                mp3_files = []
-
-                for video_url in video_urls:
-                    if onefile:
-                        output_file = downloads_folder / f"{fetch_video_titles([video_url])[0]}.mp3"
-                        download_url(video_url, onefile=True)
-                        mp3_files.append(str(output_file))
-                    else:
-                        download_url(video_url)
-                
-                def get_unique_filename(folder, base_name="playlist", extension=".mp3"):
-                    counter = 1
-                    unique_name = folder / f"{base_name}{extension}"
-                    while unique_name.exists():
-                        unique_name = folder / f"{base_name}_{counter}{extension}"
-                        counter += 1
-                    return unique_name
-                
-                if onefile and not len(video_urls) == 1:
-                    merged_playlist = get_unique_filename(downloads_folder)
-                    merge_mp3s(mp3_files, str(merged_playlist))
-                    try:
-                        for mp3 in mp3_files:
-                            Path(mp3).unlink()
-                        sys.stdout.write(f"{INFO}[cleanup]: Temporary files and folder removed{RESET}\n")
-                    except Exception as e:
-                        sys.stdout.write(f"{ERROR}[error]: Failed to clean up temporary files: {e}{RESET}\n")
-                 
-            elif choice == "exit":
-                sys.stdout.write(f"{SUCCESS}[exit]: shutting down{RESET}\n")
+            ready.set()
+            choice = await commands.get()
+            if choice is None:
+                sys.stdout.write(f"\n{SUCCESS}[exit]: shutting down{RESET}\n")
                 break
+            if not await run_command(choice.strip(), session):
+                break
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        sys.stdout.write(f"\n{ERROR}[exit]: shutting down{RESET}\n")
+    finally:
+        await close_session(session)
 
-            else:
-                sys.stdout.write(f"{ERROR}[error]: unrecognized command{RESET}\n")
-    
-    except KeyboardInterrupt:
+daemon_file = cache_folder / "daemon.json"
+daemon_socket = cache_folder / "player.sock"
+request_output = contextvars.ContextVar("request_output", default=None)
+request_tasks = contextvars.ContextVar("request_tasks", default=None)
+
+class OutputRouter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = request_output.get()
+        if buffer is not None:
+            try:
+                return buffer.write(text)
+            except ValueError:
+                pass
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return False
+
+def player_status(session):
+    track = playback["track"]
+    return {
+        "state": "stopped" if track is None else "paused" if playback["action"] == "pause" else "playing",
+        "track": track,
+        "position": round(playback_position(), 2) if track else None,
+        "volume": int(playback["volume"]),
+        "queue": list(play_queue),
+        "tasks": [task.get_name() for task in session["tasks"]],
+    }
+
+async def handle_request(request, session, stopping):
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return {"code": -32600, "message": "invalid request"}, None
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        return {"code": -32602, "message": "params must be an object"}, None
+    if request["method"] == "status":
+        return None, player_status(session)
+    if request["method"] != "command":
+        return {"code": -32601, "message": f"unknown method {request['method']}"}, None
+    if not isinstance(params.get("line"), str):
+        return {"code": -32602, "message": "command needs a line"}, None
+
+    output = io.StringIO()
+    spawned = []
+    request_output.set(output)
+    request_tasks.set(spawned)
+    try:
+        if not await run_command(params["line"].strip(), session):
+            stopping.set()
+        waiting = [task for task in spawned if task is not session["player"]]
+        if waiting and params.get("wait", True):
+            await asyncio.wait(waiting)
+        return None, {"output": output.getvalue()}
+    finally:
+        output.close()
+
+async def serve_client(reader, writer, session, stopping):
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+                error, result = await handle_request(request, session, stopping)
+            except json.JSONDecodeError:
+                request = None
+                error, result = {"code": -32700, "message": "parse error"}, None
+            except Exception as e:
+                error, result = {"code": -32603, "message": str(e)}, None
+            response = {"jsonrpc": "2.0", "id": request.get("id") if isinstance(request, dict) else None}
+            response.update({"error": error} if error else {"result": result})
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+def daemon_address():
+    try:
+        with open_traced(daemon_file, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def connect_daemon(address, timeout=2):
+    if "socket" in address:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(timeout)
+        client.connect(address["socket"])
+        return client
+    return socket.create_connection(("127.0.0.1", address["port"]), timeout=timeout)
+
+async def serve():
+    sys.stdout = OutputRouter(sys.stdout)
+    address = daemon_address()
+    if address:
+        try:
+            connect_daemon(address).close()
+            sys.stdout.write(f"{ERROR}[error]: a player daemon is already running (pid {address.get('pid')}){RESET}\n")
+            return
+        except OSError:
+            pass
+
+    session = open_session()
+    stopping = asyncio.Event()
+    clients = set()
+
+    async def client_connected(reader, writer):
+        clients.add(asyncio.current_task())
+        try:
+            await serve_client(reader, writer, session, stopping)
+        finally:
+            clients.discard(asyncio.current_task())
+
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    if sys.platform != "win32" and hasattr(asyncio, "start_unix_server"):
+        if daemon_socket.exists():
+            daemon_socket.unlink()
+        server = await asyncio.start_unix_server(client_connected, path=str(daemon_socket))
+        address = {"socket": str(daemon_socket), "pid": os.getpid()}
+    else:
+        server = await asyncio.start_server(client_connected, "127.0.0.1", 0)
+        address = {"port": server.sockets[0].getsockname()[1], "pid": os.getpid()}
+    write_file(daemon_file, json.dumps(address))
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    except (NotImplementedError, AttributeError):
+        pass
+    sys.stdout.write(f"{SUCCESS}[daemon]: listening on {address.get('socket') or '127.0.0.1:' + str(address['port'])}{RESET}\n")
+    sys.stdout.flush()
+
+    try:
+        async with server:
+            await stopping.wait()
+    except (KeyboardInterrupt, asyncio.CancelledError):
         sys.stdout.write(f"\n{ERROR}[exit]: shutting down{RESET}\n")
+    finally:
+        server.close()
+        for client in clients:
+            client.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        await close_session(session)
+        if "socket" in address and daemon_socket.exists():
+            daemon_socket.unlink()
+        if daemon_address() == address:
+            daemon_file.unlink()
+
+def start_profiling(path):
+    global trace_events
+    if path.endswith(".json"):
+        trace_events = []
+        return None
+    profilers = [cProfile.Profile()]
+    if sys.version_info < (3, 12):
+        # before 3.12 a profiler only sees the thread that enabled it, so every new
+        # thread (to_thread, download and transcode pools) starts one of its own
+        def profile_thread(frame, event, arg):
+            sys.setprofile(None)
+            profiler = cProfile.Profile()
+            profilers.append(profiler)
+            profiler.enable()
+        threading.setprofile(profile_thread)
+    profilers[0].enable()
+    return profilers
+
+def stop_profiling(path, profilers):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if profilers:
+        threading.setprofile(None)
+        profilers[0].disable()
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+    else:
+        with trace_lock:
+            events = list(trace_events)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+    sys.stdout.write(f"{INFO}[profile]: written to {path}{RESET}\n")
+
+def main():
+    arguments = sys.argv[1:]
+    profile_path = None
+    if "--profile" in arguments:
+        following = arguments[arguments.index("--profile") + 1:]
+        profile_path = following[0] if following and not following[0].startswith("--") else str(cache_folder / "profile.prof")
+    profilers = start_profiling(profile_path) if profile_path else None
+    try:
+        asyncio.run(serve() if "--daemon" in arguments else repl())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profile_path:
+            stop_profiling(profile_path, profilers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,33 @@
+import importlib.util, json, os, subprocess, sys
+from pathlib import Path
+from time import perf_counter
+
+PLAYER_PATH = Path(__file__).resolve().parent.parent / "Music Player.py"
+
+def load_player():
+    spec = importlib.util.spec_from_file_location("music_player", PLAYER_PATH)
+    player = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(player)
+    return player
+
+def measure(function, *args):
+    # children_* stay zero on Windows, so CPU figures are only meaningful on POSIX
+    before = os.times()
+    started = perf_counter()
+    result = function(*args)
+    wall = perf_counter() - started
+    after = os.times()
+    cpu = (after.user - before.user) + (after.system - before.system)
+    cpu += (after.children_user - before.children_user) + (after.children_system - before.children_system)
+    return result, {"wall_s": round(wall, 4), "cpu_s": round(cpu, 4)}
+
+def make_tone(path, seconds, frequency=440, bitrate="128k"):
+    command = [
+        "ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}",
+        "-ac", "2", "-c:a", "libmp3lame", "-b:a", bitrate, str(path)
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def emit(results):
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
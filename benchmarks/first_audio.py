@@ -0,0 +1,49 @@
+import argparse, subprocess
+from time import perf_counter
+
+from common import emit, load_player
+
+def first_pcm(command, stdin=None):
+    with subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as decoder:
+        decoder.stdout.read(4096)
+        decoder.kill()
+
+def decode_command(source):
+    return ["ffmpeg", "-i", source, "-vn", "-f", "s16le", "-ac", "2", "-ar", "48000", "-"]
+
+def pipe_first_audio(url):
+    started = perf_counter()
+    with subprocess.Popen(["yt-dlp", "-f", "bestaudio", "-o", "-", url], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as extractor:
+        first_pcm(decode_command("-"), stdin=extractor.stdout)
+        extractor.kill()
+    return perf_counter() - started
+
+def direct_first_audio(player, url):
+    started = perf_counter()
+    direct_url, cached = player.resolve_stream_url(url)
+    first_pcm(decode_command(direct_url))
+    return perf_counter() - started, cached
+
+def main():
+    parser = argparse.ArgumentParser(description="time from play request to the first decoded audio")
+    parser.add_argument("url")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engine", default="auto", choices=["auto", "api", "subprocess"])
+    args = parser.parse_args()
+
+    player = load_player()
+    player.settings["engine"] = args.engine
+    if player.resolve_stream_url(args.url)[0] is None:
+        parser.error(f"could not resolve a stream for {args.url}")
+    player.forget_stream_url(args.url)
+    pipe = [pipe_first_audio(args.url) for _ in range(args.repeat)]
+    direct = [direct_first_audio(player, args.url) for _ in range(args.repeat)]
+    emit({
+        "url": args.url,
+        "pipe_s": [round(seconds, 4) for seconds in pipe],
+        "direct_miss_s": [round(seconds, 4) for seconds, cached in direct if not cached],
+        "direct_hit_s": [round(seconds, 4) for seconds, cached in direct if cached],
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse, array, io, shutil, subprocess, tempfile
+from pathlib import Path
+
+from common import emit, load_player, make_tone, measure
+
+class NullSink:
+    def write(self, buffer):
+        pass
+
+def decode(player, path):
+    return subprocess.run(player.decode_command(str(path)), check=True, capture_output=True).stdout
+
+def python_gain(pcm, gain):
+    samples = array.array("h", pcm)
+    for index, sample in enumerate(samples):
+        samples[index] = max(-32768, min(32767, int(sample * gain)))
+    return samples
+
+def per_audio_second(result, seconds):
+    return {**result, "cpu_per_audio_s": round(result["cpu_s"] / seconds, 6)}
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost of the PCM playback pipeline per second of audio")
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--python-seconds", type=int, default=5, help="audio fed to the per-sample Python reference loop")
+    args = parser.parse_args()
+
+    player = load_player()
+    if not player.load_numpy():
+        parser.error("numpy is required for the PCM pipeline")
+    player.playback["volume"] = "80"
+    workdir = Path(tempfile.mkdtemp(prefix="gain-bench-"))
+    try:
+        make_tone(workdir / "tone.mp3", args.seconds)
+        pcm, decoded = measure(decode, player, workdir / "tone.mp3")
+        _, gain = measure(player.render_pcm, io.BytesIO(pcm), NullSink(), 0, 0.9, False)
+        _, measured = measure(player.render_pcm, io.BytesIO(pcm), NullSink(), 0, 0.9, True)
+        reference = pcm[:args.python_seconds * player.pcm_rate * 4]
+        _, python = measure(python_gain, reference, 0.72)
+        emit({
+            "audio_seconds": args.seconds,
+            "block_frames": player.pcm_block_frames,
+            "ffmpeg_decode": per_audio_second(decoded, args.seconds),
+            "numpy_gain": per_audio_second(gain, args.seconds),
+            "numpy_gain_and_loudness": per_audio_second(measured, args.seconds),
+            "python_per_sample_gain": per_audio_second(python, args.python_seconds),
+        })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse, shutil, subprocess, tempfile
+from pathlib import Path
+
+from common import emit, load_player, make_tone, measure
+
+def legacy_merge(mp3_files, output_file):
+    command = ["ffmpeg", "-y", "-i", f"concat:{'|'.join(mp3_files)}", "-acodec", "libmp3lame", output_file]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the concat-protocol re-encode merge with merge_mp3s")
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    player = load_player()
+    workdir = Path(tempfile.mkdtemp(prefix="merge-bench-"))
+    try:
+        make_tone(workdir / "tone.mp3", args.seconds)
+        tracks = []
+        for index in range(args.tracks):
+            track = workdir / f"track{index:04d}.mp3"
+            shutil.copyfile(workdir / "tone.mp3", track)
+            tracks.append(str(track))
+
+        _, legacy = measure(legacy_merge, tracks, str(workdir / "legacy.mp3"))
+        _, current = measure(player.merge_mp3s, tracks, str(workdir / "current.mp3"))
+        emit({
+            "tracks": args.tracks,
+            "seconds_per_track": args.seconds,
+            "legacy_reencode": legacy,
+            "merge_mp3s": current,
+            "speedup": round(legacy["wall_s"] / current["wall_s"], 2) if current["wall_s"] else None,
+        })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
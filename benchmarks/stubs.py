@@ -0,0 +1,115 @@
+import json, os, re, shutil, sys
+from time import sleep, time
+
+# Deterministic stand-ins for yt-dlp, ffmpeg and ffplay. suite.py writes a launcher
+# for each tool name that calls main(tool); behaviour is tuned with STUB_* variables.
+
+def setting(name, default):
+    return type(default)(os.environ.get(f"STUB_{name}", default))
+
+def log_spawn(tool, argv):
+    path = os.environ.get("STUB_LOG")
+    if path:
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(f"{time():.6f} {tool} {json.dumps(argv)}\n")
+
+def video_info(url):
+    video_id = url.split("v=")[-1]
+    return {
+        "id": video_id,
+        "title": f"Stub track {video_id}",
+        "webpage_url": url,
+        "original_url": url,
+        "duration": 180,
+    }
+
+def playlist_size(url):
+    match = re.search(r"list=\D*(\d+)", url)
+    return int(match.group(1)) if match else 10
+
+def playlist_entries(url):
+    list_id = url.split("list=")[-1]
+    for index in range(1, playlist_size(url) + 1):
+        video_id = f"{list_id}x{index:05d}"
+        yield {"id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}", "title": f"Stub track {index}"}
+
+def info(url):
+    if "list=" not in url:
+        return video_info(url)
+    return {"_type": "playlist", "id": url.split("list=")[-1], "title": f"Stub playlist {playlist_size(url)}",
+            "webpage_url": url, "original_url": url, "entries": list(playlist_entries(url))}
+
+def payload():
+    return b"\xff\xfb" + b"\0" * (setting("PAYLOAD_KB", 256) * 1024 - 2)
+
+def yt_dlp(args):
+    urls = [arg for arg in args if arg.startswith("http")]
+    sleep(setting("LATENCY", 0.0))
+
+    if "--get-url" in args:
+        for url in urls:
+            print(f"https://media.invalid/{video_info(url)['id']}?expire={int(time()) + 21600}")
+    elif "--dump-json" in args:
+        start = int(args[args.index("--playlist-items") + 1].rstrip(":")) if "--playlist-items" in args else 1
+        delay = setting("ENTRY_DELAY", 0.0)
+        for url in urls:
+            for position, entry in enumerate(playlist_entries(url), start=1):
+                if position >= start:
+                    sleep(delay)
+                    print(json.dumps(entry), flush=True)
+    elif "--dump-single-json" in args:
+        for url in urls:
+            print(json.dumps(info(url)))
+    elif "-o" in args and args[args.index("-o") + 1] == "-":
+        sys.stdout.buffer.write(payload())
+    elif "--output" in args:
+        template = args[args.index("--output") + 1]
+        extension = "mp3" if "--extract-audio" in args else "webm"
+        for url in urls:
+            metadata = info(url)
+            path = template.replace("%(title)s", metadata["title"]).replace("%(ext)s", extension).replace("%(id)s", metadata["id"])
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            data = payload()
+            if "--progress-template" in args:
+                print(f"[progress] {len(data) // 2} {len(data)}", flush=True)
+                print(f"[progress] {len(data)} {len(data)}", flush=True)
+            with open(path, "wb") as file:
+                file.write(data)
+            if "--print" in args:
+                print(path, flush=True)
+
+def ffmpeg(args):
+    sleep(setting("FFMPEG_LATENCY", 0.0))
+    inputs = [args[index + 1] for index, arg in enumerate(args) if arg == "-i"]
+    output = args[-1] if len(args) > 1 and args[-2] != "-i" else None
+
+    if any("ebur128" in arg for arg in args):
+        sys.stderr.write("Summary:\n\n  Integrated loudness:\n    I:         -14.0 LUFS\n\n  True peak:\n    Peak:       -1.0 dBFS\n")
+    elif output is None:
+        sys.stderr.write(f"Input #0, mp3, from '{inputs[0] if inputs else ''}':\n  Stream #0:0: Audio: mp3, 44100 Hz, stereo, fltp, 192 kb/s\n")
+        sys.exit(1)
+    elif output == "-":
+        sys.stdout.buffer.write(b"\0" * int(setting("PCM_SECONDS", 1.0) * 192000))
+    elif "concat" in args:
+        with open(inputs[0], "r", encoding="utf-8") as list_file:
+            parts = re.findall(r"^file '(.*)'$", list_file.read(), re.MULTILINE)
+        with open(output, "wb") as merged:
+            for part in parts:
+                with open(part.replace("'\\''", "'"), "rb") as source:
+                    shutil.copyfileobj(source, merged)
+    elif inputs and os.path.exists(inputs[0]):
+        shutil.copyfile(inputs[0], output)
+    else:
+        with open(output, "wb") as file:
+            file.write(payload())
+
+def ffplay(args):
+    if "-i" in args and args[args.index("-i") + 1] == "-":
+        while sys.stdin.buffer.read(65536):
+            pass
+    sleep(setting("PLAY_SECONDS", 0.0))
+
+def main(tool):
+    args = sys.argv[1:]
+    log_spawn(tool, args)
+    {"yt-dlp": yt_dlp, "ffmpeg": ffmpeg, "ffplay": ffplay}[tool](args)
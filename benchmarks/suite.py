@@ -0,0 +1,196 @@
+import argparse, json, os, shutil, socket, subprocess, sys, tempfile
+from collections import Counter
+from pathlib import Path
+from time import perf_counter, sleep, time
+
+from common import PLAYER_PATH, emit
+
+BENCHMARKS = Path(__file__).resolve().parent
+TOOLS = ("yt-dlp", "ffmpeg", "ffplay")
+
+def install_stubs(folder):
+    folder.mkdir(parents=True, exist_ok=True)
+    for tool in TOOLS:
+        launcher = folder / tool
+        launcher.write_text(
+            f"#!{sys.executable}\nimport sys\nsys.path.insert(0, {str(BENCHMARKS)!r})\nfrom stubs import main\nmain({tool!r})\n"
+        )
+        launcher.chmod(0o755)
+
+def make_workspace(root, playlist_size, library_size, audio_output):
+    workspace = root / f"player-{playlist_size}"
+    if workspace.exists():
+        shutil.rmtree(workspace)
+    (workspace / "home").mkdir(parents=True)
+    shutil.copyfile(PLAYER_PATH, workspace / "Music Player.py")
+    lines = [f"https://www.youtube.com/watch?v=bench{index:05d} Bench track {index}" for index in range(1, library_size + 1)]
+    lines.append(f"https://www.youtube.com/playlist?list=BENCH{playlist_size} [playlist] Stub playlist {playlist_size}")
+    (workspace / "urls.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    (workspace / "settings.json").write_text(json.dumps({"engine": "subprocess", "audio_output": audio_output}))
+    return workspace
+
+class SpawnLog:
+    def __init__(self, path):
+        self.path = path
+        self.path.touch()
+
+    def lines(self):
+        with open(self.path, "r", encoding="utf-8") as file:
+            return [line.split(" ", 2) for line in file.read().splitlines()]
+
+    def mark(self):
+        return len(self.lines())
+
+    def spawns_since(self, mark, until=None):
+        return dict(Counter(tool for stamp, tool, _ in self.lines()[mark:] if until is None or float(stamp) <= until))
+
+    def wait_for(self, mark, tool, timeout=60):
+        deadline = time() + timeout
+        while time() < deadline:
+            for stamp, logged, _ in self.lines()[mark:]:
+                if logged == tool:
+                    return float(stamp)
+            sleep(0.005)
+        return None
+
+class Daemon:
+    def __init__(self, workspace, env):
+        self.workspace = workspace
+        self.output = open(workspace / "daemon.log", "w")
+        self.process = subprocess.Popen([sys.executable, "Music Player.py", "--daemon"], cwd=workspace, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=self.output, stderr=subprocess.STDOUT)
+        deadline = time() + 60
+        while True:
+            try:
+                address = json.loads((workspace / "cache" / "daemon.json").read_text())
+                self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.connection.connect(address["socket"])
+                break
+            except (OSError, ValueError):
+                if time() > deadline or self.process.poll() is not None:
+                    raise RuntimeError(f"player daemon did not start, see {workspace / 'daemon.log'}")
+                sleep(0.01)
+        self.stream = self.connection.makefile("rwb")
+        self.ids = 0
+
+    def call(self, method, params=None):
+        self.ids += 1
+        self.stream.write(json.dumps({"jsonrpc": "2.0", "id": self.ids, "method": method, "params": params or {}}).encode() + b"\n")
+        self.stream.flush()
+        response = json.loads(self.stream.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"]["message"])
+        return response["result"]
+
+    def close(self):
+        try:
+            self.call("command", {"line": "exit"})
+        except (OSError, ValueError, RuntimeError):
+            pass
+        self.connection.close()
+        self.process.wait(timeout=60)
+        self.output.close()
+
+def measure_startup(workspace, env, log):
+    mark = log.mark()
+    started = perf_counter()
+    subprocess.run([sys.executable, "Music Player.py"], cwd=workspace, env=env, input=b"exit\n",
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return {"wall_ms": round((perf_counter() - started) * 1000, 2), "spawns": log.spawns_since(mark)}
+
+def measure_command(daemon, log, line, first_audio=False):
+    mark = log.mark()
+    started_at = time()
+    started = perf_counter()
+    daemon.call("command", {"line": line})
+    result = {"wall_ms": round((perf_counter() - started) * 1000, 2)}
+    if first_audio:
+        spawned = log.wait_for(mark, "ffplay")
+        result["first_audio_ms"] = round((spawned - started_at) * 1000, 2) if spawned else None
+        result["spawns"] = log.spawns_since(mark, until=spawned)
+        daemon.call("command", {"line": "stop"})
+    else:
+        result["spawns"] = log.spawns_since(mark)
+    return result
+
+def scenarios(args, playlist_size, playlist_number):
+    # the optional fourth item runs between the cold and warm pass; for add it removes
+    # the new tracks again so the warm pass adds them from the metadata cache
+    playlist_url = f"https://www.youtube.com/playlist?list=BENCH{playlist_size}"
+    added = ",".join(f"https://www.youtube.com/watch?v=new{index:05d}" for index in range(args.add))
+    added_numbers = ",".join(str(number) for number in range(playlist_number + 1, playlist_number + 1 + args.add))
+    yield "add", f"add {added}", False, f"remove {added_numbers}"
+    yield "ls", f"ls {playlist_number}", False, None
+    yield "play", f"play {playlist_number}.{playlist_size}", True, None
+    yield "download", "download https://www.youtube.com/watch?v=benchdl", False, None
+    if playlist_size <= args.download_max:
+        yield "onefile", f"download -onefile {playlist_url}", False, None
+
+def run_size(args, root, env, log, playlist_size):
+    results = {}
+    workspace = make_workspace(root, playlist_size, args.library, args.audio_output)
+    results["startup"] = measure_startup(workspace, {**env, "HOME": str(workspace / "home")}, log)
+    playlist_number = args.library + 1
+    for name, line, first_audio, reset in scenarios(args, playlist_size, playlist_number):
+        workspace = make_workspace(root, playlist_size, args.library, args.audio_output)
+        daemon = Daemon(workspace, {**env, "HOME": str(workspace / "home")})
+        try:
+            results[name] = {"command": line if len(line) < 120 else line[:117] + "..."}
+            results[name]["cold"] = measure_command(daemon, log, line, first_audio)
+            if reset:
+                daemon.call("command", {"line": reset})
+            results[name]["warm"] = measure_command(daemon, log, line, first_audio)
+        finally:
+            daemon.close()
+    return results
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="time player commands against stub yt-dlp, ffmpeg and ffplay binaries")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma separated playlist sizes")
+    parser.add_argument("--library", type=int, default=50, help="tracks in the synthetic urls.txt")
+    parser.add_argument("--add", type=int, default=10, help="URLs passed to one add command")
+    parser.add_argument("--download-max", type=int, default=100, help="largest playlist downloaded with -onefile")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each yt-dlp call waits before answering")
+    parser.add_argument("--entry-delay", type=float, default=0.0, help="seconds between streamed playlist entries")
+    parser.add_argument("--ffmpeg-latency", type=float, default=0.0)
+    parser.add_argument("--payload-kb", type=int, default=256, help="size of every downloaded track")
+    parser.add_argument("--audio-output", default="ffplay", choices=["ffplay", "auto"])
+    parser.add_argument("--keep", action="store_true", help="keep the temporary workspaces")
+    args = parser.parse_args()
+    if os.name == "nt":
+        parser.error("the stub binaries need a POSIX shell and Unix sockets")
+
+    root = Path(tempfile.mkdtemp(prefix="mp-bench-"))
+    install_stubs(root / "bin")
+    log = SpawnLog(root / "spawns.log")
+    env = {
+        **os.environ,
+        "HOME": str(root / "home"),
+        "PATH": f"{root / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        "STUB_LOG": str(log.path),
+        "STUB_LATENCY": str(args.latency),
+        "STUB_ENTRY_DELAY": str(args.entry_delay),
+        "STUB_FFMPEG_LATENCY": str(args.ffmpeg_latency),
+        "STUB_PAYLOAD_KB": str(args.payload_kb),
+    }
+    try:
+        sizes = [int(size) for size in args.sizes.split(",")]
+        emit({
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "config": {key: value for key, value in vars(args).items() if key != "keep"},
+            "playlists": {str(size): run_size(args, root, env, log, size) for size in sizes},
+        })
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import json, os, socket, sys
+from pathlib import Path
+
+DAEMON_FILE = Path(__file__).resolve().parent / "cache" / "daemon.json"
+
+def connect(address):
+    if "socket" in address:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(address["socket"])
+        return client
+    return socket.create_connection(("127.0.0.1", address["port"]))
+
+def call(method, params=None):
+    with open(DAEMON_FILE, "r", encoding="utf-8") as file:
+        address = json.load(file)
+    with connect(address) as client:
+        client.sendall(json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}).encode() + b"\n")
+        response = b""
+        while not response.endswith(b"\n"):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
+
+def main():
+    args = sys.argv[1:]
+    detach = "--detach" in args
+    args = [arg for arg in args if arg != "--detach"]
+    if os.name == "nt":
+        try:
+            from colorama import init
+            init()
+        except ImportError:
+            pass
+
+    try:
+        if args == ["--json"]:
+            response = call("status")
+        else:
+            response = call("command", {"line": " ".join(args) or "status", "wait": not detach})
+    except (OSError, ValueError):
+        sys.stderr.write("[error]: no player daemon is running, start one with: python \"Music Player.py\" --daemon\n")
+        return 1
+
+    if "error" in response:
+        sys.stderr.write(f"[error]: {response['error']['message']}\n")
+        return 1
+    if args == ["--json"]:
+        json.dump(response["result"], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        sys.stdout.write(response["result"]["output"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())